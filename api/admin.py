@@ -1,42 +1,104 @@
 # admin.py
 
-import json
 from telegram import Update
 from telegram.ext import ContextTypes, CommandHandler
 
-CONFIG_FILE = 'config.json'
-ADMIN_ID = 5214922760   # Your admin ID
-
-def load_config():
-    try:
-        with open(CONFIG_FILE, 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        # Default config (approval ON)
-        config = {'admin_approval_required': True}
-        save_config(config)
-        return config
-
-def save_config(config):
-    with open(CONFIG_FILE, 'w') as f:
-        json.dump(config, f, indent=2)
+try:
+    from settings import settings, POLICIES
+    from storage import METRICS_FILE
+    from metrics import format_stats, write_metrics
+    from sender import scheduler
+    from state import format_state_stats
+except ImportError:
+    from api.settings import settings, POLICIES
+    from api.storage import METRICS_FILE
+    from api.metrics import format_stats, write_metrics
+    from api.sender import scheduler
+    from api.state import format_state_stats
 
 async def admin_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
 
-    if user_id != ADMIN_ID:
+    if not settings.is_admin(user_id):
         await update.message.reply_text("❌ You are not authorized to use this command.")
         return
 
-    config = load_config()
-    current_status = config['admin_approval_required']
+    current_status = settings.get('admin_approval_required', True)
 
     new_status = not current_status
-    config['admin_approval_required'] = new_status
-    save_config(config)
+    await settings.update(admin_approval_required=new_status)
 
     status_text = "🟢 Admin approval is now *REQUIRED* for uploads." if new_status else "🟡 Admin approval is now *NOT REQUIRED* for uploads (uploads are auto-approved)."
     await update.message.reply_text(f"✅ Setting updated.\n\n{status_text}", parse_mode='Markdown')
 
-def get_admin_handler():
-    return CommandHandler("admin", admin_command)
+async def policy_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not settings.is_admin(update.effective_user.id):
+        await update.message.reply_text("❌ You are not authorized to use this command.")
+        return
+
+    if len(context.args) != 2 or context.args[1].lower() not in POLICIES + ('default',):
+        policies = settings.get('course_policies', {})
+        current = "\n".join(f"- {code}: {policy}" for code, policy in sorted(policies.items())) or "- none"
+        await update.message.reply_text(
+            "Usage: /policy <COURSE or DEPT> <auto|required|default>\n\n"
+            f"Current policies:\n{current}"
+        )
+        return
+
+    scope, policy = context.args[0].upper(), context.args[1].lower()
+    policies = dict(settings.get('course_policies', {}))
+    if policy == 'default':
+        policies.pop(scope, None)
+    else:
+        policies[scope] = policy
+    await settings.update(course_policies=policies)
+
+    await update.message.reply_text(f"✅ Approval policy for {scope} set to {policy}.")
+
+async def admins_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not settings.is_admin(update.effective_user.id):
+        await update.message.reply_text("❌ You are not authorized to use this command.")
+        return
+
+    if len(context.args) == 2 and context.args[0] in ('add', 'remove') and context.args[1].isdigit():
+        action, admin_id = context.args[0], int(context.args[1])
+        admin_ids = {int(i) for i in settings.get('admin_ids', [])}
+        if action == 'add':
+            admin_ids.add(admin_id)
+        else:
+            admin_ids.discard(admin_id)
+        await settings.update(admin_ids=sorted(admin_ids))
+
+    admin_list = "\n".join(f"- {admin_id}" for admin_id in sorted(settings.admin_ids()))
+    await update.message.reply_text(f"👮 Admins:\n{admin_list}\n\nUsage: /admins add|remove <user_id>")
+
+async def reload_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not settings.is_admin(update.effective_user.id):
+        await update.message.reply_text("❌ You are not authorized to use this command.")
+        return
+
+    changed = settings.reload(force=True)
+    await update.message.reply_text("🔄 Config reloaded." if changed else "🔄 Config reloaded, nothing changed.")
+
+async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not settings.is_admin(update.effective_user.id):
+        await update.message.reply_text("❌ You are not authorized to use this command.")
+        return
+
+    sender = scheduler.snapshot()
+    write_metrics(METRICS_FILE, force=True)
+    await update.message.reply_text(
+        f"{format_stats()}\n\n"
+        f"Send queue: {sender['queue_depth']} waiting (max {sender['max_queue_depth']}), "
+        f"{sender['retries']} retries, {sender['retry_after']} flood waits\n\n"
+        f"{format_state_stats()}"
+    )
+
+def get_admin_handlers():
+    return [
+        CommandHandler("admin", admin_command),
+        CommandHandler("policy", policy_command),
+        CommandHandler("admins", admins_command),
+        CommandHandler("reloadconfig", reload_command),
+        CommandHandler("stats", stats_command),
+    ]
@@ -1,24 +1,43 @@
+import time
+MODULE_LOADED_AT = time.perf_counter()
+
 import os
 import json
 import random
-from uuid import uuid4
+import asyncio
+import threading
 from http.server import BaseHTTPRequestHandler
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, BotCommand, InputFile
-from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, ContextTypes, filters
+from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, TypeHandler, ContextTypes, filters
 
 # ===== CONFIGURATION =====
 TOKEN = os.getenv('BOT_TOKEN', '7846786334:AAFNwjBQq7gdnwzdl7EKi4Nre2tI9WMFISk')
-ADMIN_ID = int(os.getenv('ADMIN_ID', '5214922760'))
-
-# ===== FILE PATHS =====
-DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data')
-os.makedirs(DATA_DIR, exist_ok=True)
+WEBHOOK_ACK_TIMEOUT = float(os.getenv('WEBHOOK_ACK_TIMEOUT', '8'))
+CONCURRENT_UPDATES = int(os.getenv('CONCURRENT_UPDATES', '16'))
 
-APPROVED_FILE = os.path.join(DATA_DIR, 'approved.json')
-PENDING_FILE = os.path.join(DATA_DIR, 'pending.json')
-CONFIG_FILE = os.path.join(DATA_DIR, 'config.json')
-POINTS_FILE = os.path.join(DATA_DIR, 'points.json')
-USER_IDS_FILE = os.path.join(DATA_DIR, 'user_ids.json')
+# ===== STORAGE =====
+try:
+    from settings import settings
+    from store import approved_store, pending_store, with_file_type
+    from delivery import send_course_results, send_file
+    from sender import scheduler, PRIORITY_BACKGROUND
+    from state import StateStore
+    from search import course_index, normalize_code
+    from dedup import find_duplicate
+    from storage import METRICS_FILE
+    from metrics import registry, record_update, instrument_application, write_metrics
+    from writer import writer
+except ImportError:
+    from api.settings import settings
+    from api.store import approved_store, pending_store, with_file_type
+    from api.delivery import send_course_results, send_file
+    from api.sender import scheduler, PRIORITY_BACKGROUND
+    from api.state import StateStore
+    from api.search import course_index, normalize_code
+    from api.dedup import find_duplicate
+    from api.storage import METRICS_FILE
+    from api.metrics import registry, record_update, instrument_application, write_metrics
+    from api.writer import writer
 
 # ===== UTILITY FUNCTIONS =====
 FUN_NAMES = [
@@ -31,41 +50,29 @@ FUN_NAMES = [
 def get_fun_name():
     return random.choice(FUN_NAMES)
 
-def load_json(filename):
-    if not os.path.exists(filename):
-        with open(filename, 'w') as f:
-            if 'user_ids' in filename:
-                json.dump([], f)
-            else:
-                json.dump({}, f)
-    with open(filename, 'r') as f:
-        return json.load(f)
-
-def save_json(data, filename):
-    with open(filename, 'w') as f:
-        json.dump(data, f, indent=2)
-
-def load_config():
-    try:
-        return load_json(CONFIG_FILE)
-    except FileNotFoundError:
-        config = {'admin_approval_required': True}
-        save_json(config, CONFIG_FILE)
-        return config
-
 # ===== HANDLER IMPORTS =====
 try:
     from help import get_help_handler
-    from lists import get_courselist_handler
-    from admin import get_admin_handler
+    from lists import get_courselist_handler, get_courselist_page_handler
+    from admin import get_admin_handlers
+    from moderation import get_pending_handler, get_pending_callback_handler, send_pending_digest, approve_pending
+    from inline import get_inline_handler
+    from points import ledger, get_points_handlers, POINTS_PER_UPLOAD
+    from broadcast import recipients, broadcaster, get_broadcast_handler
+    from updates import get_update_dedupe_handler, claim_callback, release_callback
 except ImportError:
     from api.help import get_help_handler
-    from api.lists import get_courselist_handler
-    from api.admin import get_admin_handler
+    from api.lists import get_courselist_handler, get_courselist_page_handler
+    from api.admin import get_admin_handlers
+    from api.moderation import get_pending_handler, get_pending_callback_handler, send_pending_digest, approve_pending
+    from api.inline import get_inline_handler
+    from api.points import ledger, get_points_handlers, POINTS_PER_UPLOAD
+    from api.broadcast import recipients, broadcaster, get_broadcast_handler
+    from api.updates import get_update_dedupe_handler, claim_callback, release_callback
 
 # ===== STATE MANAGEMENT =====
-user_states = {}
-admin_delete_reject_states = {}
+user_states = StateStore('user_states', ttl=30 * 60)
+admin_delete_reject_states = StateStore('admin_delete_reject_states', maxsize=100, ttl=24 * 60 * 60)
 
 # ===== COMMAND HANDLERS =====
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -86,13 +93,12 @@ async def upload(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def text_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
     text = update.message.text.strip()
+    state = user_states.get(user.id)
 
-    if user.id in user_states and user_states[user.id]['state'] == 'awaiting_delete_reason':
-        delete_info = user_states[user.id]
+    if state and state['state'] == 'awaiting_delete_reason':
+        delete_info = state
         resource_entry = delete_info['resource_entry']
         course_code = resource_entry['course_code']
-        file_id = resource_entry['file_id']
-        file_type = resource_entry['file_type']
         resource_key = delete_info['resource_key']
         reason = text
 
@@ -112,92 +118,59 @@ async def text_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
             f"Approve or Reject below:"
         )
 
-        if file_type == 'photo':
-            await context.bot.send_photo(
-                chat_id=ADMIN_ID,
-                photo=file_id,
-                caption=caption,
-                reply_markup=reply_markup
-            )
-        else:
-            await context.bot.send_document(
-                chat_id=ADMIN_ID,
-                document=file_id,
-                caption=caption,
-                reply_markup=reply_markup
-            )
+        for admin_id in settings.admin_ids():
+            await send_file(context.bot, admin_id, resource_entry, caption, reply_markup, rate_limit_args=PRIORITY_BACKGROUND)
 
         await update.message.reply_text("✅ Your delete request has been sent to admin for review.")
         return
 
     text_upper = text.upper()
     if text_upper.startswith("!"): 
-        course_code = text_upper[1:]
-        approved_data = load_json(APPROVED_FILE)
-
+        course_code = normalize_code(text[1:])
         files_found = []
-        for key, entry in approved_data.items():
-            if 'file_type' not in entry or 'file_id' not in entry:
-                continue
-
-            if entry['course_code'] == course_code:
-                entry_copy = entry.copy()
-                entry_copy['resource_key'] = key
-                files_found.append(entry_copy)
+        for stored_code in course_index.resolve(course_code):
+            files_found.extend(approved_store.find_course(stored_code))
 
         if files_found:
             await update.message.reply_text(f"📚 Resources for {course_code}:\n")
 
-            for entry in files_found:
-                fun_name = get_fun_name()
-                caption = f"👤 Shared by {fun_name}\nCourse: {course_code}"
-
-                buttons = [[
-                    InlineKeyboardButton("🗑️ Request Delete", callback_data=f"request_delete|{entry['resource_key']}")
-                ]]
-                reply_markup = InlineKeyboardMarkup(buttons)
-
-                if entry['file_type'] == 'photo':
-                    await context.bot.send_photo(
-                        chat_id=update.effective_chat.id,
-                        photo=entry['file_id'],
-                        caption=caption,
-                        reply_markup=reply_markup
-                    )
-                else:
-                    await context.bot.send_document(
-                        chat_id=update.effective_chat.id,
-                        document=entry['file_id'],
-                        caption=caption,
-                        reply_markup=reply_markup
-                    )
+            def caption_for(number, entry):
+                return f"#{number} 👤 Shared by {get_fun_name()}\nCourse: {course_code}"
+
+            await send_course_results(context.bot, update.effective_chat.id, files_found, caption_for)
 
             msg = "\nYou can use 'Save to Downloads' in Telegram to save files.\n\n"
             msg += "🚀 Help others! Use /upload to share more resources. Do not upload existing file again." 
             await update.message.reply_text(msg)
         else:
-            await update.message.reply_text(
-                f"No resources found for {course_code}.\n"
-                "You can contribute resources with /upload 🚀"
-            )
+            msg = f"No resources found for {course_code}.\n"
+            if course_code:
+                prefix_matches = course_index.prefix(course_code)
+                suggestions = course_index.suggest(course_code)
+                if prefix_matches:
+                    msg += "\n📚 Courses starting with " + course_code + ":\n" + ", ".join(f"!{code}" for code in prefix_matches) + "\n"
+                elif suggestions:
+                    msg += "\n🤔 Did you mean: " + ", ".join(f"!{code}" for code in suggestions) + "\n"
+            msg += "\nYou can contribute resources with /upload 🚀"
+            await update.message.reply_text(msg)
         return
 
-    if user.id in user_states and user_states[user.id]['state'] == 'awaiting_course_code':
-        user_states[user.id]['state'] = 'awaiting_file'
-        user_states[user.id]['course_code'] = text_upper
+    if state and state['state'] == 'awaiting_course_code':
+        course_code = normalize_code(text)
+        user_states[user.id] = {'state': 'awaiting_file', 'course_code': course_code}
         await update.message.reply_text(
-            f"Got course code: {text_upper}\nNow upload the file. Zipping all in one file is recommended instead of sending one by one" 
+            f"Got course code: {course_code}\nNow upload the file. Zipping all in one file is recommended instead of sending one by one" 
         )
         return
 
-    if user.id == ADMIN_ID and user.id in admin_delete_reject_states:
-        info = admin_delete_reject_states[user.id]
+    info = admin_delete_reject_states.get(user.id) if settings.is_admin(user.id) else None
+    if info:
         requester_id = info['requester_id']
         course_code = info['course_code']
         reason_text = text
 
         caption = f"❌ Your delete request for {course_code} was rejected.\nReason from admin:\n{reason_text}"
-        await context.bot.send_message(chat_id=requester_id, text=caption)
+        await context.bot.send_message(chat_id=requester_id, text=caption, rate_limit_args=PRIORITY_BACKGROUND)
         await update.message.reply_text("✅ Rejection reason sent to requester.")
 
         del admin_delete_reject_states[user.id]
@@ -216,39 +189,58 @@ async def receive_file(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if document:
         file_id = document.file_id
         file_type = 'document'
+        file_info = {
+            "file_unique_id": document.file_unique_id,
+            "file_size": document.file_size,
+            "file_name": document.file_name
+        }
     elif photo:
         file_id = photo[-1].file_id
         file_type = 'photo'
+        file_info = {
+            "file_unique_id": photo[-1].file_unique_id,
+            "file_size": photo[-1].file_size
+        }
     else:
         await update.message.reply_text("Please send a file or image.")
         return
 
-    if user.id not in user_states or user_states[user.id].get('state') != 'awaiting_file':
+    state = user_states.get(user.id)
+    if not state or state.get('state') != 'awaiting_file':
         await update.message.reply_text("First send the course code as text using /upload!")
         return
 
-    course_code = user_states[user.id]['course_code']
+    course_code = state['course_code']
     del user_states[user.id]
 
-    config = load_config()
-    admin_approval_required = config.get('admin_approval_required', True)
-
-    if admin_approval_required:
-        pending_data = load_json(PENDING_FILE)
-        short_key = str(uuid4())[:8]
-
-        pending_data[short_key] = {
-            "course_code": course_code,
-            "file_id": file_id,
-            "file_type": file_type,
-            "uploader_id": user.id,
-            "uploader_name": user.first_name
-        }
+    entry = {
+        "course_code": course_code,
+        "file_id": file_id,
+        "file_type": file_type,
+        "uploader_id": user.id,
+        "uploader_name": user.first_name,
+        "added_at": int(time.time()),
+        **file_info
+    }
+
+    existing_store, _ = find_duplicate(course_code, entry)
+    if existing_store == 'approved':
+        await update.message.reply_text(f"♻️ This file is already available for {course_code}. Type  !{course_code}  to see it.")
+        return
+    if existing_store == 'pending':
+        await update.message.reply_text(f"⏳ This file is already waiting for admin approval for {course_code}.")
+        return
 
-        save_json(pending_data, PENDING_FILE)
+    if settings.approval_required(course_code):
+        short_key = pending_store.add(entry)
+        await pending_store.flush()
 
         await update.message.reply_text(f"File received for {course_code}. Awaiting admin approval.")
 
+        if settings.get('pending_digest', False):
+            await send_pending_digest(context.bot)
+            return
+
         buttons = [
             [InlineKeyboardButton("✅ Approve", callback_data=f"approve|{short_key}"),
              InlineKeyboardButton("❌ Reject", callback_data=f"reject|{short_key}")]
@@ -257,90 +249,91 @@ async def receive_file(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
         caption = f"📥 Pending resource:\nCourse: {course_code}\nUploader: {user.first_name}\n\nApprove or Reject below:"
 
-        if file_type == 'photo':
-            await context.bot.send_photo(
-                chat_id=ADMIN_ID,
-                photo=file_id,
-                caption=caption,
-                reply_markup=reply_markup
-            )
-        else:
-            await context.bot.send_document(
-                chat_id=ADMIN_ID,
-                document=file_id,
-                caption=caption,
-                reply_markup=reply_markup
-            )
+        for admin_id in settings.admin_ids():
+            await send_file(context.bot, admin_id, entry, caption, reply_markup, rate_limit_args=PRIORITY_BACKGROUND)
     else:
-        approved_data = load_json(APPROVED_FILE)
-        approved_key = str(uuid4())[:8]
-
-        approved_data[approved_key] = {
-            "course_code": course_code,
-            "file_id": file_id,
-            "file_type": file_type,
-            "uploader_id": user.id,
-            "uploader_name": user.first_name
-        }
-
-        save_json(approved_data, APPROVED_FILE)
+        approved_store.add(entry)
+        ledger.award(user.id, user.first_name)
+        await approved_store.flush()
+        await ledger.flush()
 
         await update.message.reply_text(f"✅ Your file for {course_code} has been auto-approved and added. Type  !{course_code}  to check the resources.")
 
+ONE_SHOT_ACTIONS = ('approve', 'reject', 'delete_approve', 'delete_reject')
+
 async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
-    await query.answer()
+
+    # A second tap on the same moderation button must not run it again. If
+    # handling fails the claim is released; the handlers check that the
+    # resource is still pending or approved, so a retry cannot apply twice.
+    one_shot = query.data.split("|")[0] in ONE_SHOT_ACTIONS
+    if one_shot and not claim_callback(query):
+        await query.answer("Already handled.")
+        return
+    try:
+        await handle_button(update, context)
+    except Exception:
+        if one_shot:
+            release_callback(query)
+        raise
+
+async def handle_button(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
     data = query.data
+    await query.answer()
 
     if data.startswith("approve") or data.startswith("reject"):
         action, short_key = data.split("|")
-        pending_data = load_json(PENDING_FILE)
 
-        if short_key not in pending_data:
+        if short_key not in pending_store:
             await query.edit_message_caption("This resource is no longer pending.")
             return
 
-        entry = pending_data.pop(short_key)
-        save_json(pending_data, PENDING_FILE)
+        if action == "approve":
+            approved = approve_pending([short_key])
+            if not approved:
+                await query.edit_message_caption("⚠️ This resource can't be approved: its file type is unknown. Reject it instead.")
+                return
+            entry = approved[0]
+        else:
+            entry = pending_store.pop(short_key)
+            entry = with_file_type(entry) or entry
+        await pending_store.flush()
+        await ledger.flush()
 
         uploader_id = entry['uploader_id']
         uploader_name = entry['uploader_name']
         course_code = entry['course_code']
         file_id = entry['file_id']
-        file_type = entry['file_type']
+        file_type = entry.get('file_type')
 
         if action == "approve":
-            approved_data = load_json(APPROVED_FILE)
-            approved_key = str(uuid4())[:8]
-            approved_data[approved_key] = entry
-            save_json(approved_data, APPROVED_FILE)
-
             await query.edit_message_caption(f"✅ Approved resource for {course_code} from {uploader_name}")
 
             caption = f"✅ Your resource for {course_code} has been approved!\n\nYou can find resources by typing !CourseCode (example: !CSE421)"
             if file_type == 'photo':
-                await context.bot.send_photo(chat_id=uploader_id, photo=file_id, caption=caption)
+                await context.bot.send_photo(chat_id=uploader_id, photo=file_id, caption=caption, rate_limit_args=PRIORITY_BACKGROUND)
             else:
-                await context.bot.send_document(chat_id=uploader_id, document=file_id, caption=caption)
+                await context.bot.send_document(chat_id=uploader_id, document=file_id, caption=caption, rate_limit_args=PRIORITY_BACKGROUND)
 
         elif action == "reject":
             await query.edit_message_caption(f"❌ Rejected resource for {course_code} from {uploader_name}")
 
             caption = f"❌ Your resource for {course_code} was rejected by admin."
             if file_type == 'photo':
-                await context.bot.send_photo(chat_id=uploader_id, photo=file_id, caption=caption)
+                await context.bot.send_photo(chat_id=uploader_id, photo=file_id, caption=caption, rate_limit_args=PRIORITY_BACKGROUND)
             else:
-                await context.bot.send_document(chat_id=uploader_id, document=file_id, caption=caption)
+                await context.bot.send_document(chat_id=uploader_id, document=file_id, caption=caption, rate_limit_args=PRIORITY_BACKGROUND)
 
     elif data.startswith("request_delete"):
         _, resource_key = data.split("|")
-        approved_data = load_json(APPROVED_FILE)
+        resource_entry = approved_store.get(resource_key)
 
-        if resource_key not in approved_data:
+        if resource_entry is None:
             await query.answer("This resource no longer exists.", show_alert=True)
             return
 
-        resource_entry = approved_data[resource_key]
         user_states[query.from_user.id] = {
             'state': 'awaiting_delete_reason',
             'resource_entry': resource_entry,
@@ -352,53 +345,153 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         parts = data.split("|")
         action, resource_key, requester_id = parts[0], parts[1], int(parts[2])
 
-        approved_data = load_json(APPROVED_FILE)
+        entry = approved_store.get(resource_key)
 
-        if resource_key not in approved_data:
+        if entry is None:
             await query.answer("This resource no longer exists.", show_alert=True)
             return
 
-        entry = approved_data[resource_key]
         course_code = entry['course_code']
 
         if action == "delete_approve":
-            del approved_data[resource_key]
-            save_json(approved_data, APPROVED_FILE)
+            approved_store.pop(resource_key)
+            # The uploader was awarded for this resource when it was approved
+            uploader_id = entry.get('uploader_id')
+            if uploader_id is not None and ledger.points_of(uploader_id) > 0:
+                ledger.award(uploader_id, entry.get('uploader_name'), amount=-POINTS_PER_UPLOAD)
+            await approved_store.flush()
+            await ledger.flush()
 
             await query.edit_message_caption(f"✅ Resource for {course_code} deleted as per request.")
 
             caption = f"✅ Your delete request for {course_code} resource has been approved and removed."
-            await context.bot.send_message(chat_id=requester_id, text=caption)
+            await context.bot.send_message(chat_id=requester_id, text=caption, rate_limit_args=PRIORITY_BACKGROUND)
 
         elif action == "delete_reject":
-            admin_delete_reject_states[ADMIN_ID] = {
+            admin_delete_reject_states[query.from_user.id] = {
                 'requester_id': requester_id,
                 'course_code': course_code
             }
             await query.message.reply_text("✏️ Please type the reason why you are rejecting the delete request:")
 
-def setup_handlers():
-    app.add_handler(CommandHandler("start", start))
-    app.add_handler(CommandHandler("upload", upload))
-    app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, text_handler))
-    app.add_handler(MessageHandler(filters.Document.ALL | filters.PHOTO, receive_file))
-    app.add_handler(CallbackQueryHandler(button_handler))
+async def count_update(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    record_update()
+    write_metrics(METRICS_FILE)
+    if update.effective_chat and update.effective_chat.type == 'private':
+        recipients.remember(update.effective_chat.id)
+    broadcaster.resume_stale(context.bot)
+
+def setup_handlers(application):
+    application.add_handler(CommandHandler("start", start))
+    application.add_handler(CommandHandler("upload", upload))
+    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, text_handler))
+    application.add_handler(MessageHandler(filters.Document.ALL | filters.PHOTO, receive_file))
+    application.add_handler(get_courselist_page_handler())
+    application.add_handler(get_pending_callback_handler())
+    application.add_handler(CallbackQueryHandler(button_handler))
     
-    app.add_handler(get_help_handler())
-    app.add_handler(get_courselist_handler())
-    app.add_handler(get_admin_handler())
-
-app = Application.builder().token(TOKEN).build()
-setup_handlers()
+    application.add_handler(get_help_handler())
+    application.add_handler(get_courselist_handler())
+    application.add_handler(get_pending_handler())
+    application.add_handler(get_inline_handler())
+    for admin_handler in get_admin_handlers():
+        application.add_handler(admin_handler)
+    for points_handler in get_points_handlers():
+        application.add_handler(points_handler)
+    application.add_handler(get_broadcast_handler())
+
+    instrument_application(application)
+    application.add_handler(get_update_dedupe_handler(), group=-2)
+    application.add_handler(TypeHandler(Update, count_update), group=-1)
+
+# ===== APPLICATION =====
+# Built lazily and cached at module level so warm serverless invocations
+# reuse the Application, its HTTP pool and the in-memory stores.
+_app = None
+_app_ready = False
+_loop = None
+_loop_lock = threading.Lock()
+_inflight = set()
+
+webhook_stats = {
+    'cold_start_seconds': None,
+    'warm_requests': 0,
+    'warm_seconds_total': 0.0,
+    'timed_out_acks': 0,
+}
+
+registry.gauge('bot_cold_start_seconds', 'Time from module import to the first acked update',
+               lambda: webhook_stats['cold_start_seconds'])
+registry.gauge('bot_webhook_timed_out_acks', 'Updates acked before their handlers finished',
+               lambda: webhook_stats['timed_out_acks'])
+
+async def drain_writes(application):
+    await writer.drain()
+
+def build_app(polling=False):
+    global _app
+    if _app is None:
+        # Handlers only mutate stores synchronously and persist through the
+        # single store writer, so updates can be processed concurrently.
+        builder = (
+            Application.builder().token(TOKEN)
+            .connection_pool_size(8)
+            .rate_limiter(scheduler)
+            .concurrent_updates(CONCURRENT_UPDATES)
+            .post_shutdown(drain_writes)
+        )
+        if not polling:
+            builder = builder.updater(None)
+        _app = builder.build()
+        setup_handlers(_app)
+    return _app
+
+async def get_ready_app():
+    global _app_ready
+    application = build_app()
+    if not _app_ready:
+        await application.initialize()
+        # Nothing runs between webhook requests, so broadcasts advance
+        # inside them
+        broadcaster.in_requests = True
+        _app_ready = True
+    return application
+
+async def process_webhook_update(data):
+    started_at = time.monotonic()
+    application = await get_ready_app()
+    update = Update.de_json(data, application.bot)
+
+    # Ack within WEBHOOK_ACK_TIMEOUT so Telegram does not redeliver. Work that
+    # is still running stays scheduled on the cached loop and finishes during
+    # the next warm invocation.
+    task = asyncio.ensure_future(application.process_update(update))
+    _inflight.add(task)
+    task.add_done_callback(_inflight.discard)
+    done, _ = await asyncio.wait({task}, timeout=WEBHOOK_ACK_TIMEOUT)
+    if done:
+        # A running broadcast gets what is left of the ack window
+        await broadcaster.run_slice(application.bot, WEBHOOK_ACK_TIMEOUT - (time.monotonic() - started_at))
+    return bool(done)
+
+def run_webhook_update(data):
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+        return _loop.run_until_complete(process_webhook_update(data))
 
 class WebhookHandler(BaseHTTPRequestHandler):
     def do_POST(self):
+        started_at = time.perf_counter()
+        cold = webhook_stats['cold_start_seconds'] is None
         content_length = int(self.headers['Content-Length'])
         post_data = self.rfile.read(content_length)
-        
+
         try:
-            update = Update.de_json(json.loads(post_data.decode('utf-8')), app.bot)
-            app.update_queue.put(update)
+            finished = run_webhook_update(json.loads(post_data.decode('utf-8')))
+            if not finished:
+                webhook_stats['timed_out_acks'] += 1
             self.send_response(200)
         except Exception as e:
             print(f"Error processing update: {e}")
@@ -406,12 +499,40 @@ class WebhookHandler(BaseHTTPRequestHandler):
         finally:
             self.end_headers()
 
-def handler(request):
-    webhook_handler = WebhookHandler()
-    webhook_handler.request = request
-    webhook_handler.do_POST()
-    return {'statusCode': 200}
+        if cold:
+            webhook_stats['cold_start_seconds'] = time.perf_counter() - MODULE_LOADED_AT
+            print(f"Cold start: {webhook_stats['cold_start_seconds']:.3f}s (import {IMPORT_SECONDS:.3f}s)")
+        else:
+            webhook_stats['warm_requests'] += 1
+            webhook_stats['warm_seconds_total'] += time.perf_counter() - started_at
+
+    def do_GET(self):
+        if self.path.split('?')[0].rstrip('/').endswith('/metrics'):
+            body = registry.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        warm = webhook_stats['warm_requests']
+        body = json.dumps({
+            'ok': True,
+            'cold_start_seconds': webhook_stats['cold_start_seconds'],
+            'warm_requests': warm,
+            'warm_avg_seconds': webhook_stats['warm_seconds_total'] / warm if warm else None,
+            'timed_out_acks': webhook_stats['timed_out_acks'],
+        }).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.end_headers()
+        self.wfile.write(body)
+
+# Vercel's Python runtime looks for a BaseHTTPRequestHandler named `handler`
+handler = WebhookHandler
+
+IMPORT_SECONDS = time.perf_counter() - MODULE_LOADED_AT
 
 if __name__ == '__main__':
     print("Bot running in polling mode...")
-    app.run_polling()
\ No newline at end of file
+    build_app(polling=True).run_polling()
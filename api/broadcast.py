@@ -0,0 +1,280 @@
+# broadcast.py
+
+import os
+import time
+import asyncio
+from uuid import uuid4
+from bisect import bisect_right
+from telegram import Update
+from telegram.error import Forbidden, BadRequest
+from telegram.ext import ContextTypes, CommandHandler
+
+try:
+    from settings import settings
+    from storage import get_backend
+    from sender import PRIORITY_BULK, GLOBAL_RATE
+    from writer import writer
+    from store import CacheWrites
+except ImportError:
+    from api.settings import settings
+    from api.storage import get_backend
+    from api.sender import PRIORITY_BULK, GLOBAL_RATE
+    from api.writer import writer
+    from api.store import CacheWrites
+
+CHUNK_SIZE = int(os.getenv('BROADCAST_CHUNK_SIZE', '200'))
+MAX_IN_FLIGHT = int(os.getenv('BROADCAST_CONCURRENCY', str(max(1, int(GLOBAL_RATE)))))
+TIME_BUDGET = float(os.getenv('BROADCAST_TIME_BUDGET', '0'))  # seconds per run, 0 = until done
+REQUEST_BUDGET = float(os.getenv('BROADCAST_REQUEST_BUDGET', '5'))  # seconds per webhook request
+STALE_SECONDS = 120
+# Only one process may pick up an interrupted broadcast; dispatcher workers
+# other than the first turn this off
+RESUME_STALE = os.getenv('BROADCAST_RESUME_STALE', '1') == '1'
+
+# ===== RECIPIENTS =====
+# user_ids.json as a set in memory, reloaded when the backend version moves
+# (other dispatcher workers remember users too). Private chats are remembered
+# as updates arrive; users who blocked the bot are pruned by the broadcaster.
+class Recipients:
+    def __init__(self, backend=None):
+        self._backend = backend
+        self.ids = None
+        self._writes = CacheWrites('user_ids')
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            self._backend = get_backend()
+        return self._backend
+
+    def load(self):
+        if self.ids is None or self._writes.stale(self.backend):
+            self.ids = set(self.backend.load('user_ids'))
+            self._writes.loaded(self.backend)
+        return self.ids
+
+    def submit(self, ops):
+        # Broadcast checkpoints carry the prune ops, so they go through here too
+        return self._writes.submit(self.backend, ops)
+
+    def remember(self, user_id):
+        ids = self.load()
+        if user_id in ids:
+            return
+        ids.add(user_id)
+        self.submit([('put', 'user_ids', user_id, None)])
+
+    def prune_ops(self, user_ids):
+        ids = self.load()
+        for user_id in user_ids:
+            ids.discard(user_id)
+        return [('delete', 'user_ids', user_id) for user_id in user_ids]
+
+recipients = Recipients()
+
+# ===== BROADCASTER =====
+# One broadcast at a time, checkpointed in broadcast.json under 'current':
+#   {'status': 'running' | 'paused' | 'done', 'admin_id', 'from_chat_id',
+#    'message_id', 'cursor': last user id handled, 'delivered', 'failed',
+#    'pruned', 'elapsed', 'updated_at'}
+# Recipients are walked in user id order in chunks. After every chunk the
+# cursor, the counters and the pruned ids are written as one batch, so a
+# crash or a frozen serverless instance resumes after the last full chunk.
+#
+# On the serverless webhook path nothing runs on the loop between requests,
+# so a background task would only move while other updates are handled.
+# There `in_requests` is set and the job advances in slices: every request
+# runs run_slice() after its update, under REQUEST_BUDGET. A lease in the job
+# keeps two warm instances from sending the same slice; it is best effort,
+# as the backends have no compare-and-set.
+class Broadcaster:
+    def __init__(self):
+        self.task = None
+        self._checked_at = 0.0
+        self.in_requests = False
+        self.owner = uuid4().hex[:8]
+
+    @property
+    def backend(self):
+        return recipients.backend
+
+    def current(self):
+        return self.backend.load('broadcast').get('current')
+
+    def running_here(self):
+        return self.task is not None and not self.task.done()
+
+    async def start(self, bot, admin_id, from_chat_id, message_id):
+        job = {
+            'status': 'running', 'admin_id': admin_id, 'from_chat_id': from_chat_id,
+            'message_id': message_id, 'cursor': None, 'recipients': len(recipients.load()),
+            'delivered': 0, 'failed': 0, 'pruned': 0, 'elapsed': 0.0, 'updated_at': time.time(),
+        }
+        await recipients.submit([('put', 'broadcast', 'current', dict(job))])
+        if not self.in_requests:
+            self.task = asyncio.ensure_future(self.run(bot, job))
+        return job
+
+    async def resume(self, bot):
+        job = self.current()
+        if not job or job['status'] == 'done' or self.running_here():
+            return None
+        job = dict(job, status='running')
+        if self.in_requests:
+            # The slice at the end of this request picks it up
+            job.update(updated_at=time.time(), lease_until=0)
+            await recipients.submit([('put', 'broadcast', 'current', dict(job))])
+        else:
+            self.task = asyncio.ensure_future(self.run(bot, job))
+        return job
+
+    def resume_stale(self, bot):
+        # Picks up a broadcast whose process died mid-run. Request slices
+        # continue any running job, so this is only for background runs.
+        if self.in_requests or not RESUME_STALE or self.running_here():
+            return
+        if time.monotonic() - self._checked_at < STALE_SECONDS / 4:
+            return
+        self._checked_at = time.monotonic()
+        job = self.current()
+        if job and job['status'] == 'running' and time.time() - job['updated_at'] > STALE_SECONDS:
+            self.task = asyncio.ensure_future(self.run(bot, job))
+
+    async def run_slice(self, bot, budget):
+        # Continues a running broadcast inside the current webhook request
+        budget = min(budget, REQUEST_BUDGET)
+        if not self.in_requests or budget <= 1 or self.running_here():
+            return
+        job = self.current()
+        if not job or job['status'] != 'running' or job.get('lease_until', 0) > time.time():
+            return
+        job = dict(job, lease_owner=self.owner, lease_until=time.time() + budget + STALE_SECONDS / 4)
+        await recipients.submit([('put', 'broadcast', 'current', dict(job))])
+        if (self.current() or {}).get('lease_owner') != self.owner:
+            return
+        self.task = asyncio.ensure_future(self.run(bot, job, budget, pause=False))
+        try:
+            await self.task
+        except Exception as e:
+            # The update itself was handled; a failed slice must not fail the ack
+            print(f"Broadcast slice failed: {e}")
+
+    async def _send(self, bot, job, user_id, semaphore):
+        async with semaphore:
+            try:
+                await bot.copy_message(
+                    chat_id=user_id, from_chat_id=job['from_chat_id'], message_id=job['message_id'],
+                    rate_limit_args=PRIORITY_BULK
+                )
+                return 'delivered'
+            except Forbidden:
+                return 'blocked'
+            except BadRequest as e:
+                return 'blocked' if 'chat not found' in str(e).lower() else 'failed'
+            except Exception:
+                return 'failed'
+
+    async def _checkpoint(self, job, ops=()):
+        job['updated_at'] = time.time()
+        await recipients.submit(list(ops) + [('put', 'broadcast', 'current', dict(job))])
+
+    async def run(self, bot, job, budget=TIME_BUDGET, pause=True):
+        # Out of budget, a run is paused until /broadcast resume; a request
+        # slice (pause=False) stays running for the next request
+        semaphore = asyncio.Semaphore(MAX_IN_FLIGHT)
+        ordered = sorted(recipients.load())
+        position = bisect_right(ordered, job['cursor']) if job['cursor'] is not None else 0
+        started_at = time.monotonic()
+        run_elapsed = job['elapsed']
+        # A slice sends chunks of about half its budget at the global rate
+        chunk_size = CHUNK_SIZE if pause else max(1, min(CHUNK_SIZE, int(budget * GLOBAL_RATE / 2)))
+
+        while position < len(ordered):
+            chunk = ordered[position:position + chunk_size]
+            chunk_started_at = time.monotonic()
+            results = await asyncio.gather(*(self._send(bot, job, user_id, semaphore) for user_id in chunk))
+            blocked = [user_id for user_id, result in zip(chunk, results) if result == 'blocked']
+            job['delivered'] += results.count('delivered')
+            job['failed'] += results.count('failed')
+            job['pruned'] += len(blocked)
+            job['cursor'] = chunk[-1]
+            job['elapsed'] = run_elapsed + time.monotonic() - started_at
+            position += len(chunk)
+
+            # A slice also stops when another chunk like this one would not fit
+            used = time.monotonic() - started_at
+            if not pause:
+                used += time.monotonic() - chunk_started_at
+            if budget and used >= budget and position < len(ordered):
+                if not pause:
+                    job['lease_until'] = 0
+                    await self._checkpoint(job, recipients.prune_ops(blocked))
+                    return
+                job['status'] = 'paused'
+                await self._checkpoint(job, recipients.prune_ops(blocked))
+                await bot.send_message(
+                    chat_id=job['admin_id'],
+                    text=f"⏸️ Broadcast paused after {job['delivered'] + job['failed'] + job['pruned']} recipients. "
+                         "Send /broadcast resume to continue."
+                )
+                return
+            await self._checkpoint(job, recipients.prune_ops(blocked))
+
+        job['status'] = 'done'
+        await self._checkpoint(job)
+        await bot.send_message(chat_id=job['admin_id'], text=format_report(job))
+
+def format_report(job):
+    handled = job['delivered'] + job['failed'] + job['pruned']
+    rate = handled / job['elapsed'] if job['elapsed'] else 0.0
+    status = {'running': "📣 Broadcast running", 'paused': "⏸️ Broadcast paused", 'done': "✅ Broadcast finished"}[job['status']]
+    return (
+        f"{status}\n\n"
+        f"Delivered: {job['delivered']}\n"
+        f"Failed: {job['failed']}\n"
+        f"Blocked (removed): {job['pruned']}\n"
+        f"Handled: {handled} of ~{job['recipients']} in {job['elapsed']:.0f}s ({rate:.1f} msg/s)"
+    )
+
+broadcaster = Broadcaster()
+
+# ===== HANDLERS =====
+async def broadcast_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = update.effective_user.id
+    if not settings.is_admin(user_id):
+        await update.message.reply_text("❌ You are not authorized to use this command.")
+        return
+
+    action = context.args[0].lower() if context.args else None
+    job = broadcaster.current()
+
+    if action == 'status':
+        await update.message.reply_text(format_report(job) if job else "No broadcast yet.")
+        return
+
+    if action == 'resume':
+        resumed = await broadcaster.resume(context.bot)
+        await update.message.reply_text(
+            "▶️ Broadcast resumed from its last checkpoint." if resumed else "Nothing to resume."
+        )
+        return
+
+    source = update.message.reply_to_message
+    if source is None:
+        await update.message.reply_text(
+            "Reply to the message you want to send with /broadcast.\n\n"
+            "/broadcast status – progress of the last broadcast\n"
+            "/broadcast resume – continue a paused or interrupted one"
+        )
+        return
+
+    if broadcaster.running_here() or (job and job['status'] == 'running' and time.time() - job['updated_at'] <= STALE_SECONDS):
+        await update.message.reply_text("A broadcast is already running. Check /broadcast status.")
+        return
+
+    await writer.drain()
+    job = await broadcaster.start(context.bot, user_id, source.chat_id, source.message_id)
+    await update.message.reply_text(f"📣 Broadcasting to {job['recipients']} users. You will get a report when it is done.")
+
+def get_broadcast_handler():
+    return CommandHandler("broadcast", broadcast_command)
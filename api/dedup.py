@@ -0,0 +1,43 @@
+# dedup.py
+
+import sys
+
+try:
+    from store import approved_store, pending_store, content_keys
+except ImportError:
+    from api.store import approved_store, pending_store, content_keys
+
+def find_duplicate(course_code, entry):
+    # Returns ('approved' | 'pending', key) for an existing copy of the file
+    for store in (approved_store, pending_store):
+        key = store.find_duplicate(course_code, entry)
+        if key is not None:
+            return store.name, key
+    return None, None
+
+def find_existing_duplicates():
+    # Approved entries win over pending ones, earlier entries over later ones
+    seen = set()
+    duplicates = []
+    for store in (approved_store, pending_store):
+        store.refresh()
+        for key, entry in store.entries.items():
+            keys = {(entry.get('course_code'), content_key) for content_key in content_keys(entry)}
+            if keys & seen:
+                duplicates.append((store, key, entry))
+            seen |= keys
+    return duplicates
+
+def dedup(dry_run=False):
+    duplicates = find_existing_duplicates()
+    for store, key, entry in duplicates:
+        print(f"[Dedup] {store.name}/{key}: duplicate {entry.get('course_code')} file")
+        if not dry_run:
+            store.pop(key)
+    return len(duplicates)
+
+if __name__ == '__main__':
+    dry_run = '--dry-run' in sys.argv
+    removed = dedup(dry_run)
+    action = "Would remove" if dry_run else "Removed"
+    print(f"[Dedup] {action} {removed} duplicate entries.")
@@ -0,0 +1,87 @@
+# delivery.py
+
+import os
+import asyncio
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup, InputMediaDocument, InputMediaPhoto
+
+# 'album' groups results into media groups, 'single' sends one message per file
+DELIVERY_MODE = os.getenv('DELIVERY_MODE', 'album')
+ALBUM_SIZE = 10                  # Telegram's media group limit
+MAX_IN_FLIGHT = int(os.getenv('DELIVERY_CONCURRENCY', '3'))
+KEYBOARD_WIDTH = 5
+KEYBOARD_MAX_BUTTONS = 100       # Telegram's inline keyboard limit
+
+def build_albums(files):
+    # Photos and documents cannot share a media group, so batch them apart.
+    # Each item keeps its 1-based position so the delete keyboard can refer to it.
+    photos = []
+    documents = []
+    for number, (resource_key, entry) in enumerate(files, start=1):
+        item = (number, resource_key, entry)
+        if entry['file_type'] == 'photo':
+            photos.append(item)
+        else:
+            documents.append(item)
+
+    albums = []
+    for items in (photos, documents):
+        for start in range(0, len(items), ALBUM_SIZE):
+            albums.append(items[start:start + ALBUM_SIZE])
+    return albums
+
+def build_delete_keyboards(files):
+    buttons = [
+        InlineKeyboardButton(f"🗑️ {number}", callback_data=f"request_delete|{resource_key}")
+        for number, (resource_key, _) in enumerate(files, start=1)
+    ]
+    keyboards = []
+    for start in range(0, len(buttons), KEYBOARD_MAX_BUTTONS):
+        chunk = buttons[start:start + KEYBOARD_MAX_BUTTONS]
+        rows = [chunk[i:i + KEYBOARD_WIDTH] for i in range(0, len(chunk), KEYBOARD_WIDTH)]
+        keyboards.append(InlineKeyboardMarkup(rows))
+    return keyboards
+
+async def send_file(bot, chat_id, entry, caption, reply_markup=None, **kwargs):
+    if entry['file_type'] == 'photo':
+        return await bot.send_photo(chat_id=chat_id, photo=entry['file_id'], caption=caption, reply_markup=reply_markup, **kwargs)
+    return await bot.send_document(chat_id=chat_id, document=entry['file_id'], caption=caption, reply_markup=reply_markup, **kwargs)
+
+async def send_album(bot, chat_id, album, caption_for):
+    if len(album) == 1:
+        number, _, entry = album[0]
+        return await send_file(bot, chat_id, entry, caption_for(number, entry))
+
+    media = []
+    for number, _, entry in album:
+        media_class = InputMediaPhoto if entry['file_type'] == 'photo' else InputMediaDocument
+        media.append(media_class(media=entry['file_id'], caption=caption_for(number, entry)))
+    return await bot.send_media_group(chat_id=chat_id, media=media)
+
+async def send_course_albums(bot, chat_id, files, caption_for):
+    semaphore = asyncio.Semaphore(MAX_IN_FLIGHT)
+
+    async def dispatch(album):
+        async with semaphore:
+            await send_album(bot, chat_id, album, caption_for)
+
+    await asyncio.gather(*(dispatch(album) for album in build_albums(files)))
+
+    for keyboard in build_delete_keyboards(files):
+        await bot.send_message(
+            chat_id=chat_id,
+            text="🗑️ To request a delete, tap the number shown on the file:",
+            reply_markup=keyboard
+        )
+
+async def send_course_singles(bot, chat_id, files, caption_for):
+    for number, (resource_key, entry) in enumerate(files, start=1):
+        buttons = [[
+            InlineKeyboardButton("🗑️ Request Delete", callback_data=f"request_delete|{resource_key}")
+        ]]
+        await send_file(bot, chat_id, entry, caption_for(number, entry), InlineKeyboardMarkup(buttons))
+
+async def send_course_results(bot, chat_id, files, caption_for):
+    if DELIVERY_MODE == 'single':
+        await send_course_singles(bot, chat_id, files, caption_for)
+    else:
+        await send_course_albums(bot, chat_id, files, caption_for)
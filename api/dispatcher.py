@@ -0,0 +1,322 @@
+# dispatcher.py
+
+import os
+import sys
+import json
+import time
+import queue
+import asyncio
+import hashlib
+import threading
+import multiprocessing
+from bisect import bisect
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+try:
+    from metrics import registry, write_metrics
+except ImportError:
+    from api.metrics import registry, write_metrics
+
+# Nothing that reads per-worker settings (storage, sender, bot) is imported at
+# module level: spawned workers import this module before run_worker applies
+# their environment.
+
+WORKERS = int(os.getenv('DISPATCH_WORKERS', str(os.cpu_count() or 2)))
+RING_REPLICAS = 64
+REPORT_INTERVAL = float(os.getenv('DISPATCH_REPORT_INTERVAL', '5'))
+LOG_INTERVAL = 60
+POLL_TIMEOUT = 30
+WEBHOOK_PORT = int(os.getenv('PORT', '8080'))
+
+# ===== HASH RING =====
+# Consistent hashing of the routing key onto worker numbers. Each worker owns
+# RING_REPLICAS points, so changing the worker count only moves about 1/N of
+# the users to another worker.
+def _hash(value):
+    return int.from_bytes(hashlib.md5(str(value).encode('utf-8')).digest()[:8], 'big')
+
+class HashRing:
+    def __init__(self, nodes, replicas=RING_REPLICAS):
+        self.points = sorted((_hash(f"{node}#{replica}"), node) for node in nodes for replica in range(replicas))
+        self.hashes = [point for point, _ in self.points]
+
+    def node_for(self, key):
+        return self.points[bisect(self.hashes, _hash(key)) % len(self.points)][1]
+
+def route_key(data):
+    # Conversation state is kept per user, so the sender is the key; chats
+    # without a sender (channel posts) fall back to the chat id
+    for field, payload in data.items():
+        if not isinstance(payload, dict):
+            continue
+        if isinstance(payload.get('from'), dict):
+            return payload['from']['id']
+        chat = payload.get('chat') or (payload.get('message') or {}).get('chat')
+        if chat:
+            return chat['id']
+    return data.get('update_id')
+
+# ===== WORKER =====
+# A worker runs the normal bot Application without an updater. Updates of one
+# routing key are chained so they are handled in arrival order; different
+# users still run concurrently, up to CONCURRENT_UPDATES at a time.
+async def _handle(application, update, previous, limit, load):
+    if previous is not None:
+        await asyncio.wait({previous})
+    async with limit:
+        load['inflight'] += 1
+        started_at = time.perf_counter()
+        try:
+            await application.process_update(update)
+        except Exception as e:
+            load['errors'] += 1
+            print(f"[Worker {load['worker']}] Error processing update {update.update_id}: {e}")
+        finally:
+            load['inflight'] -= 1
+            load['handled'] += 1
+            load['busy_seconds'] += time.perf_counter() - started_at
+
+def _report(load, inbox, reports):
+    try:
+        load['backlog'] = inbox.qsize()
+    except NotImplementedError:
+        load['backlog'] = -1
+    load['reported_at'] = time.time()
+    reports.put(dict(load))
+
+async def _serve_worker(index, inbox, reports):
+    try:
+        import bot
+    except ImportError:
+        from api import bot
+    from telegram import Update
+
+    application = bot.build_app()
+    await application.initialize()
+    limit = asyncio.Semaphore(bot.CONCURRENT_UPDATES)
+    load = {'worker': index, 'pid': os.getpid(), 'handled': 0, 'errors': 0, 'inflight': 0, 'busy_seconds': 0.0}
+    chains = {}  # routing key -> task of its latest update
+    reported_at = 0.0
+    print(f"[Worker {index}] Ready (pid {os.getpid()}, storage {os.getenv('STORAGE_BACKEND')})")
+
+    def release(key, task):
+        if chains.get(key) is task:
+            del chains[key]
+
+    while True:
+        try:
+            item = await asyncio.to_thread(inbox.get, True, REPORT_INTERVAL)
+        except queue.Empty:
+            item = ()
+        if item is None:
+            break
+        if item:
+            key, data = item
+            update = Update.de_json(data, application.bot)
+            task = asyncio.ensure_future(_handle(application, update, chains.get(key), limit, load))
+            chains[key] = task
+            task.add_done_callback(lambda task, key=key: release(key, task))
+        if time.monotonic() - reported_at >= REPORT_INTERVAL:
+            reported_at = time.monotonic()
+            _report(load, inbox, reports)
+
+    if chains:
+        await asyncio.wait(list(chains.values()))
+    await bot.writer.drain()
+    await application.shutdown()
+    _report(load, inbox, reports)
+    print(f"[Worker {index}] Stopped after {load['handled']} updates")
+
+def run_worker(index, inbox, reports, env):
+    os.environ.update(env)
+    asyncio.run(_serve_worker(index, inbox, reports))
+
+# ===== DISPATCHER =====
+class Dispatcher:
+    def __init__(self, workers=WORKERS):
+        try:
+            from storage import METRICS_FILE
+        except ImportError:
+            from api.storage import METRICS_FILE
+
+        self.workers = workers
+        self.context = multiprocessing.get_context('spawn')
+        self.inboxes = [self.context.Queue() for _ in range(workers)]
+        self.reports = self.context.Queue()
+        self.processes = [None] * workers
+        self.ring = HashRing(range(workers))
+        self.loads = {}
+        self.stopping = False
+
+        # Workers share the storage layer, which must be safe across
+        # processes: the journal backend (flock + tail replay) or SQLite
+        if os.getenv('STORAGE_BACKEND', 'json') == 'json':
+            print("[Dispatcher] The JSON backend is single-process; using STORAGE_BACKEND=journal")
+            os.environ['STORAGE_BACKEND'] = 'journal'
+
+        send_rate = float(os.getenv('SEND_GLOBAL_RATE', '30'))
+        root, extension = os.path.splitext(METRICS_FILE)
+        self.metrics_file = METRICS_FILE
+        self.envs = [{
+            'SEND_GLOBAL_RATE': str(send_rate / workers),
+            'METRICS_FILE': f"{root}.worker-{index}{extension}",
+            'BROADCAST_RESUME_STALE': '1' if index == 0 else '0',
+        } for index in range(workers)]
+
+        self.routed = registry.counter('bot_dispatched_updates_total', 'Updates routed to each worker', ('worker',))
+        registry.gauge(
+            'bot_worker_load', 'Load reported by dispatcher workers',
+            lambda: {
+                (str(index), stat): value
+                for index, load in self.loads.items()
+                for stat, value in load.items() if stat not in ('worker', 'pid', 'reported_at')
+            },
+            ('worker', 'stat')
+        )
+
+    def _spawn(self, index):
+        process = self.context.Process(
+            target=run_worker, args=(index, self.inboxes[index], self.reports, self.envs[index]),
+            name=f"bot-worker-{index}", daemon=True
+        )
+        process.start()
+        self.processes[index] = process
+
+    def start(self):
+        for index in range(self.workers):
+            self._spawn(index)
+        threading.Thread(target=self._collect, name='dispatcher-reports', daemon=True).start()
+        print(f"[Dispatcher] Started {self.workers} workers")
+
+    def _collect(self):
+        logged_at = time.monotonic()
+        while True:
+            try:
+                load = self.reports.get(timeout=REPORT_INTERVAL)
+                self.loads[load['worker']] = load
+            except queue.Empty:
+                pass
+            if self.stopping:
+                continue
+
+            # A dead worker is restarted on the same inbox, so its users keep
+            # their place on the ring and nothing queued for them is lost
+            for index, process in enumerate(self.processes):
+                if process is not None and not process.is_alive():
+                    print(f"[Dispatcher] Worker {index} exited with {process.exitcode}, restarting")
+                    self._spawn(index)
+
+            write_metrics(self.metrics_file)
+            if time.monotonic() - logged_at >= LOG_INTERVAL:
+                logged_at = time.monotonic()
+                print("[Dispatcher] " + format_loads(self.loads))
+
+    def dispatch(self, data):
+        key = route_key(data)
+        index = self.ring.node_for(key)
+        self.inboxes[index].put((key, data))
+        self.routed.inc(str(index))
+        return index
+
+    def stop(self, timeout=30):
+        self.stopping = True
+        for inbox in self.inboxes:
+            inbox.put(None)
+        for process in self.processes:
+            if process is not None:
+                process.join(timeout)
+        # The final report of each worker
+        while True:
+            try:
+                load = self.reports.get(timeout=0.5)
+                self.loads[load['worker']] = load
+            except queue.Empty:
+                break
+
+def format_loads(loads):
+    parts = []
+    for index in sorted(loads):
+        load = loads[index]
+        parts.append(
+            f"worker {index}: {load['handled']} handled, {load['inflight']} in flight, "
+            f"{load['backlog']} queued, {load['errors']} errors, busy {load['busy_seconds']:.1f}s"
+        )
+    return "; ".join(parts) or "no worker reports yet"
+
+# ===== FRONTS =====
+async def _poll(dispatcher):
+    try:
+        from bot import TOKEN
+    except ImportError:
+        from api.bot import TOKEN
+    from telegram import Bot, Update
+
+    offset = None
+    async with Bot(TOKEN) as telegram_bot:
+        await telegram_bot.delete_webhook()
+        print("[Dispatcher] Polling for updates...")
+        while True:
+            updates = await telegram_bot.get_updates(
+                offset=offset, timeout=POLL_TIMEOUT, allowed_updates=Update.ALL_TYPES
+            )
+            for update in updates:
+                dispatcher.dispatch(update.to_dict())
+                offset = update.update_id + 1
+
+def serve_polling(dispatcher):
+    asyncio.run(_poll(dispatcher))
+
+def serve_webhook(dispatcher, port=WEBHOOK_PORT):
+    class FrontHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            # Acked as soon as the update is queued for its worker
+            try:
+                content_length = int(self.headers['Content-Length'])
+                dispatcher.dispatch(json.loads(self.rfile.read(content_length).decode('utf-8')))
+                self.send_response(200)
+            except Exception as e:
+                print(f"Error dispatching update: {e}")
+                self.send_response(500)
+            self.end_headers()
+
+        def do_GET(self):
+            if self.path.split('?')[0].rstrip('/').endswith('/metrics'):
+                body = registry.render().encode('utf-8')
+                content_type = 'text/plain; version=0.0.4'
+            else:
+                body = json.dumps({'ok': True, 'workers': dispatcher.loads}).encode('utf-8')
+                content_type = 'application/json'
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    print(f"[Dispatcher] Listening for webhook updates on port {port}")
+    ThreadingHTTPServer(('', port), FrontHandler).serve_forever()
+
+USAGE = """Usage:
+  python dispatcher.py polling [workers]   fetch updates with getUpdates and route them to workers
+  python dispatcher.py webhook [workers]   receive updates on $PORT and route them to workers"""
+
+if __name__ == '__main__':
+    mode = sys.argv[1] if len(sys.argv) > 1 else None
+    if mode not in ('polling', 'webhook'):
+        print(USAGE)
+        sys.exit(1)
+
+    dispatcher = Dispatcher(int(sys.argv[2]) if len(sys.argv) > 2 else WORKERS)
+    dispatcher.start()
+    try:
+        if mode == 'polling':
+            serve_polling(dispatcher)
+        else:
+            serve_webhook(dispatcher)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print("[Dispatcher] Stopping workers...")
+        dispatcher.stop()
+        print("[Dispatcher] " + format_loads(dispatcher.loads))
@@ -1,20 +1,519 @@
+# fix_json.py
+
+import os
+import sys
 import json
+from collections import Counter
+
+try:
+    from storage import DATA_DIR, JSON_FILES, RESOURCE_STORES, JOURNAL_FILE
+    from store import content_keys, infer_file_type, FILE_TYPES
+    from search import normalize_code
+    from points import POINTS_PER_UPLOAD
+    from settings import POLICIES
+except ImportError:
+    from api.storage import DATA_DIR, JSON_FILES, RESOURCE_STORES, JOURNAL_FILE
+    from api.store import content_keys, infer_file_type, FILE_TYPES
+    from api.search import normalize_code
+    from api.points import POINTS_PER_UPLOAD
+    from api.settings import POLICIES
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEXT_FILES = ('README.md', 'requirements.txt')
+
+CHUNK_SIZE = 64 * 1024
+MAX_RECORD_SIZE = 16 * 1024 * 1024
+
+BROADCAST_STATUSES = ('running', 'paused', 'done')
+
+BOMS = (
+    (b'\xef\xbb\xbf', 'utf-8-sig'),
+    (b'\xff\xfe', 'utf-16'),
+    (b'\xfe\xff', 'utf-16'),
+)
+
+def detect_encoding(path):
+    with open(path, 'rb') as f:
+        head = f.read(4)
+    for bom, encoding in BOMS:
+        if head.startswith(bom):
+            return encoding
+    return 'utf-8'
+
+# ===== STREAMING READER =====
+# Yields the top-level members of a JSON object as (key, value) or of an
+# array as (index, value), holding one member and one chunk in memory. A file
+# that ends early or turns malformed stops the stream with `error` set; the
+# members read before that point are still yielded, so they can be salvaged.
+class RecordStream:
+    decoder = json.JSONDecoder()
+
+    def __init__(self, path, chunk_size=CHUNK_SIZE):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.kind = None
+        self.error = None
+
+    def __iter__(self):
+        with open(self.path, encoding=detect_encoding(self.path)) as f:
+            self._file = f
+            self._buffer = ''
+            self._pos = 0
+            self._consumed = 0
+            self._eof = False
+            try:
+                yield from self._members()
+            except ValueError as e:
+                self.error = str(e)
+
+    def _fill(self):
+        chunk = self._file.read(self.chunk_size)
+        if not chunk:
+            self._eof = True
+            return False
+        self._consumed += self._pos
+        self._buffer = self._buffer[self._pos:] + chunk
+        self._pos = 0
+        return True
+
+    def _peek(self):
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos].isspace():
+                self._pos += 1
+            if self._pos < len(self._buffer) or not self._fill():
+                return self._buffer[self._pos:self._pos + 1]
+
+    def _decode(self):
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self._buffer, self._pos)
+                # A number cut off at the end of the buffer also decodes
+                if end < len(self._buffer) or self._eof:
+                    self._pos = end
+                    return value
+            except json.JSONDecodeError as e:
+                if self._eof:
+                    raise ValueError(f"{e.msg} (character {self._consumed + e.pos})")
+            if len(self._buffer) - self._pos > MAX_RECORD_SIZE:
+                raise ValueError(f"record at character {self._consumed + self._pos} is larger than {MAX_RECORD_SIZE} bytes")
+            self._fill()
+
+    def _expect(self, expected):
+        char = self._peek()
+        if char not in expected:
+            found = repr(char) if char else "end of file"
+            raise ValueError(f"expected {' or '.join(map(repr, expected))} at character {self._consumed + self._pos}, found {found}")
+        self._pos += 1
+        return char
+
+    def _members(self):
+        opener = self._expect('{[')
+        self.kind = 'object' if opener == '{' else 'array'
+        closer = '}' if opener == '{' else ']'
+        if self._peek() == closer:
+            self._pos += 1
+            return
+
+        index = 0
+        while True:
+            if self.kind == 'object':
+                self._expect('"')
+                self._pos -= 1
+                key = self._decode()
+                self._expect(':')
+            else:
+                key = index
+            self._peek()
+            yield key, self._decode()
+            index += 1
+            if self._expect(',' + closer) == closer:
+                return
+
+# ===== SNAPSHOT WRITER =====
+# Writes members one at a time to a sibling temp file, in the same layout as
+# json.dump(data, f, indent=2). commit() renames it over the original.
+class SnapshotWriter:
+    def __init__(self, path, kind):
+        self.path = path
+        self.temp_path = f"{path}.tmp"
+        self.kind = kind
+        self.count = 0
+        self._file = open(self.temp_path, 'w')
+        self._file.write('{' if kind == 'object' else '[')
+
+    def write(self, key, value):
+        text = json.dumps(value, indent=2).replace('\n', '\n  ')
+        if self.kind == 'object':
+            text = f"{json.dumps(key)}: {text}"
+        self._file.write(('\n  ' if self.count == 0 else ',\n  ') + text)
+        self.count += 1
+
+    def close(self):
+        closer = '}' if self.kind == 'object' else ']'
+        self._file.write(f"\n{closer}" if self.count else closer)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+
+    def commit(self):
+        os.replace(self.temp_path, self.path)
+
+    def discard(self):
+        if not self._file.closed:
+            self._file.close()
+        if os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
+
+# ===== SCHEMAS =====
+# One checker per store: check(key, value, report) returns the (possibly
+# repaired) value, or None to drop the member. Reasons are counted in the
+# report under 'fixed' and 'dropped'.
+def as_user_id(value):
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str) and value.strip().lstrip('-').isdigit():
+        return int(value)
+    return None
+
+def check_resource(key, entry, report):
+    if not isinstance(entry, dict):
+        return report.drop('not an object')
+    entry = dict(entry)
+
+    file_id = entry.get('file_id')
+    if not isinstance(file_id, str) or not file_id:
+        return report.drop('missing file_id')
+    if entry.get('file_type') not in FILE_TYPES:
+        file_type = infer_file_type(file_id)
+        if file_type is None:
+            return report.drop('unknown file_type')
+        entry['file_type'] = file_type
+        report.fix(f"file_type inferred as {file_type}")
+
+    course_code = entry.get('course_code')
+    if not isinstance(course_code, str) or not normalize_code(course_code):
+        return report.drop('missing course_code')
+    if normalize_code(course_code) != course_code:
+        entry['course_code'] = normalize_code(course_code)
+        report.fix('course_code normalized')
+
+    if 'uploader_id' in entry:
+        uploader_id = as_user_id(entry['uploader_id'])
+        if uploader_id is None:
+            del entry['uploader_id']
+            report.fix('invalid uploader_id removed')
+        elif uploader_id != entry['uploader_id']:
+            entry['uploader_id'] = uploader_id
+            report.fix('uploader_id converted to int')
+    if report.name == 'pending' and 'uploader_id' not in entry:
+        # Approving or rejecting notifies the uploader
+        return report.drop('pending entry without uploader_id')
+
+    for field in ('file_size', 'added_at'):
+        if field in entry and (isinstance(entry[field], bool) or not isinstance(entry[field], (int, float))):
+            del entry[field]
+            report.fix(f"invalid {field} removed")
+    return entry
+
+def check_points(user_id, record, report):
+    if as_user_id(user_id) is None:
+        return report.drop('invalid user id')
+    if isinstance(record, dict):
+        points = record.get('points')
+    else:
+        points = record
+    if isinstance(points, bool) or not isinstance(points, int):
+        return report.drop('invalid points')
+    return {'points': points, 'name': record.get('name') if isinstance(record, dict) else None}
+
+def check_user_id(index, user_id, report):
+    converted = as_user_id(user_id)
+    if converted is None:
+        return report.drop('invalid user id')
+    if converted != user_id:
+        report.fix('user id converted to int')
+    return converted
+
+def check_config(key, value, report):
+    valid = {
+        'admin_approval_required': lambda v: isinstance(v, bool),
+        'pending_digest': lambda v: isinstance(v, bool),
+        'admin_ids': lambda v: isinstance(v, list) and all(as_user_id(i) is not None for i in v),
+        'course_policies': lambda v: isinstance(v, dict) and all(p in POLICIES for p in v.values()),
+    }.get(key)
+    if valid is not None and not valid(value):
+        # Dropping the key falls back to the default
+        return report.drop(f"invalid {key}")
+    if key == 'admin_ids':
+        value = [as_user_id(i) for i in value]
+    return value
+
+def check_broadcast(key, job, report):
+    if not isinstance(job, dict) or job.get('status') not in BROADCAST_STATUSES:
+        return report.drop('invalid broadcast job')
+    for field in ('delivered', 'failed', 'pruned'):
+        if not isinstance(job.get(field), int):
+            return report.drop('invalid broadcast job')
+    return job
+
+CHECKS = {
+    'approved': check_resource,
+    'pending': check_resource,
+    'config': check_config,
+    'points': check_points,
+    'user_ids': check_user_id,
+    'broadcast': check_broadcast,
+}
+KINDS = {name: 'array' if name == 'user_ids' else 'object' for name in CHECKS}
+
+# ===== REPAIR =====
+class StoreReport:
+    def __init__(self, name):
+        self.name = name
+        self.records = 0
+        self.kept = 0
+        self.fixed = Counter()
+        self.dropped = Counter()
+        self.error = None
+        self.missing = False
+        self.notes = []
+
+    def fix(self, reason):
+        self.fixed[reason] += 1
+
+    def drop(self, reason):
+        self.dropped[reason] += 1
+        return None
+
+    def changed(self):
+        return bool(self.fixed or self.dropped or self.error)
+
+    def as_dict(self):
+        return {
+            'records': self.records, 'kept': self.kept, 'fixed': dict(self.fixed),
+            'dropped': dict(self.dropped), 'error': self.error, 'missing': self.missing, 'notes': self.notes,
+        }
+
+    def summary(self):
+        if self.missing:
+            return f"{self.name}: no file"
+        parts = [f"{self.name}: {self.records} records, {self.kept} kept"]
+        parts += [f"fixed {count}× {reason}" for reason, count in self.fixed.items()]
+        parts += [f"dropped {count}× {reason}" for reason, count in self.dropped.items()]
+        parts += self.notes
+        if self.error:
+            parts.append(f"unreadable after record {self.records}: {self.error}; file left unchanged")
+        return "; ".join(parts)
+
+def scan(name, path, report, output=None, extra=None):
+    # Streams one store through its checker; `extra(key, value)` may veto a
+    # record that passed (used for duplicates) by returning False
+    if not os.path.exists(path):
+        report.missing = True
+        return
+    check = CHECKS[name]
+    stream = RecordStream(path)
+    seen_keys = set()
+    for key, value in stream:
+        report.records += 1
+        if stream.kind != KINDS[name]:
+            report.error = f"expected a JSON {KINDS[name]}"
+            return
+        if stream.kind == 'object':
+            if key in seen_keys:
+                report.drop('repeated key')
+                continue
+            seen_keys.add(key)
+        value = check(key, value, report)
+        if value is None or (extra is not None and extra(key, value) is False):
+            continue
+        report.kept += 1
+        if output is not None:
+            output.write(key, value)
+    report.error = stream.error
+
+def repair(files=JSON_FILES, dry_run=False):
+    # Approved before pending, so an approved copy wins over a pending one and
+    # the points are counted from what survives
+    reports = {}
+    outputs = {}
+    seen_content = set()
+    points = {}
+    courses = {name: Counter() for name in RESOURCE_STORES}
+
+    def open_output(name):
+        if dry_run or not os.path.exists(files[name]):
+            return None
+        outputs[name] = SnapshotWriter(files[name], KINDS[name])
+        return outputs[name]
+
+    def resource_index(name):
+        def index(key, entry):
+            # The dedup index: (course_code, content key) as in ResourceStore
+            keys = {(entry['course_code'], content_key) for content_key in content_keys(entry)}
+            if keys & seen_content:
+                reports[name].drop('duplicate of an earlier entry')
+                return False
+            seen_content.update(keys)
+            courses[name][entry['course_code']] += 1
+            if name == 'approved' and 'uploader_id' in entry:
+                record = points.setdefault(str(entry['uploader_id']), {'points': 0, 'name': None})
+                record['points'] += POINTS_PER_UPLOAD
+                record['name'] = entry.get('uploader_name') or record['name']
+        return index
+
+    try:
+        for name in RESOURCE_STORES:
+            reports[name] = StoreReport(name)
+            scan(name, files[name], reports[name], open_output(name), resource_index(name))
+            if courses[name]:
+                reports[name].notes.append(f"{len(courses[name])} courses")
+
+        # points.json is rebuilt from the approved resources; the old file is
+        # only read to report the differences and keep known names. Counting
+        # from a partly read approved.json would take points away, so then
+        # it is only checked like the other stores.
+        report = reports['points'] = StoreReport('points')
+        if reports['approved'].error:
+            scan('points', files['points'], report, open_output('points'))
+            report.notes.append("not rebuilt, approved.json could not be read in full")
+        else:
+            previous = {}
+            scan('points', files['points'], report, extra=lambda key, record: previous.__setitem__(str(key), record))
+            for user_id, record in points.items():
+                record['name'] = record['name'] or previous.get(user_id, {}).get('name')
+            changed = sum(1 for user_id in points.keys() | previous.keys()
+                          if points.get(user_id, {}).get('points') != previous.get(user_id, {}).get('points'))
+            if changed:
+                report.fixed['total recounted from approved'] = changed
+            report.notes.append(f"rebuilt for {len(points)} contributors")
+            if not dry_run:
+                output = outputs['points'] = SnapshotWriter(files['points'], 'object')
+                for user_id in sorted(points, key=lambda user_id: (-points[user_id]['points'], user_id)):
+                    output.write(user_id, points[user_id])
+
+        for name in ('user_ids', 'config', 'broadcast'):
+            reports[name] = StoreReport(name)
+            if name == 'user_ids':
+                ids = set()
+                def unique(index, user_id):
+                    if user_id in ids:
+                        reports['user_ids'].drop('repeated user id')
+                        return False
+                    ids.add(user_id)
+                scan(name, files[name], reports[name], open_output(name), unique)
+            else:
+                scan(name, files[name], reports[name], open_output(name))
+
+        for output in outputs.values():
+            output.close()
+    except BaseException:
+        for output in outputs.values():
+            output.discard()
+        raise
+
+    # Every snapshot is complete on disk before the first one is swapped in.
+    # A store that could not be read to the end keeps its original file; the
+    # snapshot would only hold the records before the damage.
+    for name, output in outputs.items():
+        if reports[name].error:
+            output.discard()
+        else:
+            output.commit()
+    return reports
 
 def clean_json(filename):
+    # Repairs a single approved/pending file in place
+    name = 'pending' if 'pending' in os.path.basename(filename) else 'approved'
+    report = StoreReport(name)
+    output = SnapshotWriter(filename, 'object')
     try:
-        with open(filename, 'r') as f:
-            data = json.load(f)
+        scan(name, filename, report, output)
+        output.close()
+    except BaseException:
+        output.discard()
+        raise
+    if report.error:
+        output.discard()
+    else:
+        output.commit()
+    print(f"[Cleaner] Cleaned {filename}. {report.summary()}")
+    return report
 
-        # Remove invalid entries (missing file_id or file_type)
-        cleaned_data = {
-            k: v for k, v in data.items()
-            if 'file_id' in v and 'file_type' in v
-        }
+# ===== TEXT FILES =====
+def convert_text_files(root=ROOT_DIR, dry_run=False):
+    # README.md and requirements.txt were saved as UTF-16, which pip and most
+    # tools cannot read
+    converted = []
+    for filename in TEXT_FILES:
+        path = os.path.join(root, filename)
+        if not os.path.exists(path):
+            continue
+        encoding = detect_encoding(path)
+        if encoding == 'utf-8':
+            continue
+        converted.append((filename, encoding))
+        if dry_run:
+            continue
+        with open(path, encoding=encoding, newline='') as f:
+            text = f.read()
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8', newline='') as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    return converted
+
+USAGE = """Usage:
+  python fix_json.py repair [--dry-run] [--report FILE]   validate every data file and write repaired snapshots
+  python fix_json.py encodings [--dry-run]               convert UTF-16 README.md / requirements.txt to UTF-8
+
+repair works on the JSON snapshots in DATA_DIR; stop the bot first."""
+
+if __name__ == '__main__':
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+    dry_run = '--dry-run' in sys.argv
+    action = "Would convert" if dry_run else "Converted"
+
+    if command == 'encodings':
+        converted = convert_text_files(dry_run=dry_run)
+        for filename, encoding in converted:
+            print(f"[Cleaner] {action} {filename} from {encoding} to utf-8")
+        if not converted:
+            print("[Cleaner] All text files are already utf-8.")
+        sys.exit(0)
+
+    if command != 'repair':
+        print(USAGE)
+        sys.exit(1)
+
+    if os.path.exists(JOURNAL_FILE) and os.path.getsize(JOURNAL_FILE):
+        # Records in the journal are not in the snapshots yet
+        print(f"[Cleaner] {JOURNAL_FILE} holds {os.path.getsize(JOURNAL_FILE)} bytes of unfolded writes. "
+              "Run `python storage.py compact` first.")
+        if not dry_run:
+            sys.exit(1)
 
-        with open(filename, 'w') as f:
-            json.dump(cleaned_data, f, indent=2)
+    reports = repair(dry_run=dry_run)
+    for report in reports.values():
+        print(f"[Cleaner] {report.summary()}")
+    unreadable = [name for name, report in reports.items() if report.error]
+    changed = [name for name, report in reports.items() if report.changed() and not report.error]
+    if dry_run:
+        print(f"[Cleaner] Dry run, nothing written. {len(changed)} stores would change: {', '.join(changed) or 'none'}")
+    else:
+        print(f"[Cleaner] Repaired snapshots written to {DATA_DIR}.")
+    if unreadable:
+        print(f"[Cleaner] Not repaired, fix by hand: {', '.join(unreadable)}")
 
-        print(f"[Cleaner] Cleaned {filename}. Removed bad entries.")
+    if '--report' in sys.argv:
+        report_path = sys.argv[sys.argv.index('--report') + 1]
+        with open(report_path, 'w') as f:
+            json.dump({name: report.as_dict() for name, report in reports.items()}, f, indent=2)
+        print(f"[Cleaner] Report written to {report_path}")
 
-    except Exception as e:
-        print(f"[Cleaner] Error cleaning {filename}: {e}")
+    if unreadable:
+        sys.exit(1)
@@ -7,8 +7,10 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     msg = (
         "📋 *BRACU Resource Bot - Instructions*\n\n"
         "➡️ To get course resources, type like `!ECO101`\n_(Don’t forget to put '!' before the course code, another example : !CSE421)_\n\n"
+        f"➡️ In any chat, type `@{context.bot.username} CSE421` to pick and share a file without leaving the chat\n\n"
         "➡️ To upload course materials, type `/upload`\n\n"
-        "➡️ To check courses with resources, type `/courselist`\n\n"
+        "➡️ To check courses with resources, type `/courselist` (or `/courselist CSE` for one department)\n\n"
+        "➡️ Every approved upload earns a point: `/mypoints` and `/leaderboard`\n\n"
         "➡️ To start over, type `/start`\n\n"
         "➡️ Get all instructions, type `/help`\n\n"
         "➡️ Inbox admin: [@stacklyy](https://t.me/stacklyy)"
@@ -0,0 +1,78 @@
+# inline.py
+
+import os
+from telegram import Update, InlineQueryResultCachedDocument, InlineQueryResultCachedPhoto
+from telegram.ext import ContextTypes, InlineQueryHandler
+
+try:
+    from store import approved_store
+    from search import course_index, normalize_code
+except ImportError:
+    from api.store import approved_store
+    from api.search import course_index, normalize_code
+
+RESULTS_PER_PAGE = 50            # Telegram's limit per answer
+PREFIX_COURSES = 5
+CACHE_TIME = int(os.getenv('INLINE_CACHE_TIME', '300'))
+
+# ===== RESULT CACHE =====
+# Inline results per course, built once from the stored file_ids and dropped
+# when the approved store changes that course. Telegram caches whole answers
+# for CACHE_TIME seconds on its side, so repeated queries never reach us.
+class InlineResultCache:
+    def __init__(self, store):
+        self.store = store
+        self.results = {}  # course_code -> [InlineQueryResult]
+        store.subscribe(self._on_change)
+
+    def _on_change(self, event, key, entry):
+        if event == 'reset':
+            self.results.clear()
+        else:
+            self.results.pop(entry.get('course_code'), None)
+
+    def build(self, key, entry):
+        course_code = entry['course_code']
+        caption = f"📚 {course_code} · shared via BRACU Resource Bot"
+        if entry['file_type'] == 'photo':
+            return InlineQueryResultCachedPhoto(
+                id=key, photo_file_id=entry['file_id'], title=course_code,
+                description=f"Photo shared by {entry.get('uploader_name', 'someone')}", caption=caption
+            )
+        return InlineQueryResultCachedDocument(
+            id=key, document_file_id=entry['file_id'], title=entry.get('file_name') or f"{course_code} document",
+            description=f"{course_code} · shared by {entry.get('uploader_name', 'someone')}", caption=caption
+        )
+
+    def for_course(self, course_code):
+        self.store.refresh()
+        results = self.results.get(course_code)
+        if results is None:
+            results = self.results[course_code] = [
+                self.build(key, entry) for key, entry in self.store.find_course(course_code)
+            ]
+        return results
+
+inline_results = InlineResultCache(approved_store)
+
+def search_results(query):
+    course_code = normalize_code(query)
+    if not course_code:
+        return []
+    codes = course_index.resolve(course_code) or course_index.prefix(course_code, PREFIX_COURSES)
+    results = []
+    for code in codes:
+        results.extend(inline_results.for_course(code))
+    return results
+
+async def inline_query(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.inline_query
+    offset = int(query.offset) if query.offset.isdigit() else 0
+    results = search_results(query.query)
+
+    page = results[offset:offset + RESULTS_PER_PAGE]
+    next_offset = str(offset + RESULTS_PER_PAGE) if offset + RESULTS_PER_PAGE < len(results) else ''
+    await query.answer(page, cache_time=CACHE_TIME, is_personal=False, next_offset=next_offset)
+
+def get_inline_handler():
+    return InlineQueryHandler(inline_query)
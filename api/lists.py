@@ -1,43 +1,97 @@
 # lists.py
 
-import json
-from telegram import Update
-from telegram.ext import ContextTypes, CommandHandler
+import time
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import BadRequest
+from telegram.ext import ContextTypes, CommandHandler, CallbackQueryHandler
 
-APPROVED_FILE = 'approved.json'
+try:
+    from summary import course_summary
+except ImportError:
+    from api.summary import course_summary
 
-def load_json(filename):
-    with open(filename, 'r') as f:
-        return json.load(f)
+PAGE_SIZE = 25
+DEPARTMENTS_PER_ROW = 4
 
-async def courselist(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    approved_data = load_json(APPROVED_FILE)
+def format_updated(updated_at):
+    if not updated_at:
+        return ""
+    return f", updated {time.strftime('%d %b %Y', time.localtime(updated_at))}"
+
+def render_page(department=None, page=0):
+    rows, page, pages, total = course_summary.page(department, page, PAGE_SIZE)
+    if not total:
+        return None, None
+
+    title = f"{department} courses" if department else "Available Courses with Resources"
+    course_list_text = "\n".join(
+        f"- {code} ({info['count']} file{'s' if info['count'] != 1 else ''}{format_updated(info['updated_at'])})"
+        for code, info in rows
+    )
+    footer = (
+        f"\n\nPage {page + 1}/{pages} · {total} courses\n\n"
+        "➡️ Type /upload or /help to add another course here with resources.\n"
+        "➡️ Type !CourseCode (e.g. !CSE421) or /help to access the materials."
+    )
+    text = f"📚 *{title}:*\n\n{course_list_text}{footer}"
+
+    scope = department or '*'
+    departments = ['*'] + course_summary.departments()
+    department_buttons = [
+        InlineKeyboardButton(
+            ("• " if d == scope else "") + ("All" if d == '*' else d),
+            callback_data=f"courselist|{d}|0"
+        )
+        for d in departments
+    ]
+    keyboard = [
+        department_buttons[i:i + DEPARTMENTS_PER_ROW]
+        for i in range(0, len(department_buttons), DEPARTMENTS_PER_ROW)
+    ]
+
+    navigation = []
+    if page > 0:
+        navigation.append(InlineKeyboardButton("◀️ Prev", callback_data=f"courselist|{scope}|{page - 1}"))
+    if page < pages - 1:
+        navigation.append(InlineKeyboardButton("Next ▶️", callback_data=f"courselist|{scope}|{page + 1}"))
+    if navigation:
+        keyboard.append(navigation)
 
-    # Collect all course codes from approved resources
-    course_codes = set()
-    for entry in approved_data.values():
-        if 'course_code' in entry:
-            course_codes.add(entry['course_code'])
+    return text, InlineKeyboardMarkup(keyboard)
 
-    if not course_codes:
+async def courselist(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    department = context.args[0].upper() if context.args else None
+    text, reply_markup = render_page(department)
+
+    if text is None:
         await update.message.reply_text(
             "No courses with resources available yet.\n\n"
             "You can add one using /upload 🚀"
         )
         return
 
-    # Sort the course list alphabetically
-    sorted_courses = sorted(course_codes)
+    await update.message.reply_text(text, parse_mode='Markdown', reply_markup=reply_markup)
 
-    course_list_text = "\n".join(f"- {code}" for code in sorted_courses)
-    footer = (
-        "\n\nAvailable courses list with resources.\n\n"
-        "➡️ Type /upload or /help to add another course here with resources.\n"
-        "➡️ Type !CourseCode (e.g. !CSE421) or /help to access the materials."
-    )
+async def courselist_page(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    await query.answer()
+
+    _, scope, page = query.data.split("|")
+    department = None if scope == '*' else scope
+    text, reply_markup = render_page(department, int(page))
 
-    final_text = f"📚 *Available Courses with Resources:*\n\n{course_list_text}{footer}"
-    await update.message.reply_text(final_text, parse_mode='Markdown')
+    if text is None:
+        await query.edit_message_text("No courses with resources available yet.")
+        return
+
+    try:
+        await query.edit_message_text(text, parse_mode='Markdown', reply_markup=reply_markup)
+    except BadRequest:
+        # Tapping the page that is already shown leaves the message unchanged
+        pass
 
 def get_courselist_handler():
     return CommandHandler("courselist", courselist)
+
+def get_courselist_page_handler():
+    return CallbackQueryHandler(courselist_page, pattern=r'^courselist\|')
@@ -0,0 +1,245 @@
+# metrics.py
+
+import os
+import time
+import functools
+from bisect import bisect_left
+
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+RATE_WINDOW = 60
+WRITE_INTERVAL = float(os.getenv('METRICS_WRITE_INTERVAL', '15'))
+
+# ===== METRIC TYPES =====
+# Minimal in-process counters and fixed-bucket histograms. Percentiles are
+# estimated from the buckets, which is what a Prometheus server would do too.
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self.values = {}
+
+    def inc(self, *labels, amount=1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def total(self):
+        return sum(self.values.values())
+
+    def samples(self):
+        for labels, value in self.values.items():
+            yield self.name, labels, value
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labelnames=(), buckets=BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self.values = {}  # labels -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, seconds, *labels):
+        series = self.values.get(labels)
+        if series is None:
+            series = self.values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, seconds)] += 1
+        series[-1] += seconds
+
+    def count(self, *labels):
+        series = self.values.get(labels)
+        return sum(series[:-1]) if series else 0
+
+    def quantile(self, fraction, *labels):
+        series = self.values.get(labels)
+        if not series:
+            return None
+        counts = series[:-1]
+        rank = fraction * sum(counts)
+        seen = 0
+        for index, bucket_count in enumerate(counts):
+            if bucket_count and seen + bucket_count >= rank:
+                lower = self.buckets[index - 1] if index > 0 else 0.0
+                upper = self.buckets[index] if index < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.buckets[-1]
+
+    def samples(self):
+        for labels, series in self.values.items():
+            cumulative = 0
+            for index, bound in enumerate(self.buckets + (float('inf'),)):
+                cumulative += series[index]
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                yield f"{self.name}_bucket", labels + (le,), cumulative
+            yield f"{self.name}_sum", labels, series[-1]
+            yield f"{self.name}_count", labels, cumulative
+
+class Gauge:
+    kind = 'gauge'
+
+    def __init__(self, name, help_text, read, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self.read = read  # returns a number, or {labels tuple: number}
+
+    def samples(self):
+        value = self.read()
+        if isinstance(value, dict):
+            for labels, sample in value.items():
+                yield self.name, labels, sample
+        elif value is not None:
+            yield self.name, (), value
+
+# ===== REGISTRY =====
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+        self.started_at = time.time()
+
+    def _register(self, metric):
+        return self.metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._register(Counter(name, help_text, labelnames))
+
+    def histogram(self, name, help_text, labelnames=()):
+        return self._register(Histogram(name, help_text, labelnames))
+
+    def gauge(self, name, help_text, read, labelnames=()):
+        return self._register(Gauge(name, help_text, read, labelnames))
+
+    def render(self):
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                labelnames = metric.labelnames + (('le',) if name.endswith('_bucket') else ())
+                if labels:
+                    pairs = ','.join(f'{k}="{v}"' for k, v in zip(labelnames, labels))
+                    lines.append(f"{name}{{{pairs}}} {value}")
+                else:
+                    lines.append(f"{name} {value}")
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path):
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'w') as f:
+            f.write(self.render())
+        os.replace(temp_path, path)
+
+registry = Registry()
+_last_write = 0.0
+
+def write_metrics(path, force=False):
+    global _last_write
+    now = time.monotonic()
+    if not force and now - _last_write < WRITE_INTERVAL:
+        return
+    _last_write = now
+    try:
+        registry.write(path)
+    except OSError as e:
+        # Serverless deployments may have a read-only data dir; /metrics still works
+        print(f"Could not write metrics to {path}: {e}")
+
+UPDATES = registry.counter('bot_updates_total', 'Updates received')
+HANDLER_SECONDS = registry.histogram('bot_handler_seconds', 'Handler latency', ('handler',))
+HANDLER_ERRORS = registry.counter('bot_handler_errors_total', 'Handler exceptions', ('handler',))
+STORAGE_SECONDS = registry.histogram('bot_storage_seconds', 'Storage backend operation latency', ('op', 'store'))
+API_SECONDS = registry.histogram('bot_telegram_api_seconds', 'Telegram API call latency', ('method',))
+API_ERRORS = registry.counter('bot_telegram_api_errors_total', 'Telegram API errors', ('method', 'error'))
+
+# ===== UPDATE RATE =====
+_recent_updates = {}  # unix second -> count, trimmed to RATE_WINDOW
+
+def record_update():
+    UPDATES.inc()
+    now = int(time.time())
+    _recent_updates[now] = _recent_updates.get(now, 0) + 1
+    if len(_recent_updates) > RATE_WINDOW:
+        for second in [s for s in _recent_updates if s <= now - RATE_WINDOW]:
+            del _recent_updates[second]
+
+def updates_per_second():
+    now = int(time.time())
+    recent = sum(count for second, count in _recent_updates.items() if second > now - RATE_WINDOW)
+    return recent / RATE_WINDOW
+
+registry.gauge('bot_updates_per_second', f'Updates per second over the last {RATE_WINDOW}s', updates_per_second)
+
+# ===== INSTRUMENTATION =====
+def instrument_callback(name, callback):
+    @functools.wraps(callback)
+    async def timed(update, context):
+        started_at = time.perf_counter()
+        try:
+            return await callback(update, context)
+        except Exception:
+            HANDLER_ERRORS.inc(name)
+            raise
+        finally:
+            HANDLER_SECONDS.observe(time.perf_counter() - started_at, name)
+    return timed
+
+def instrument_application(application):
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            handler.callback = instrument_callback(handler.callback.__name__, handler.callback)
+
+def instrument_backend(backend):
+    for op in ('load', 'put', 'delete', 'move', 'replace', 'apply'):
+        method = getattr(backend, op)
+
+        def timed(name, *args, _method=method, _op=op, **kwargs):
+            started_at = time.perf_counter()
+            try:
+                return _method(name, *args, **kwargs)
+            finally:
+                store = name if isinstance(name, str) else 'batch'
+                STORAGE_SECONDS.observe(time.perf_counter() - started_at, _op, store)
+
+        setattr(backend, op, timed)
+    return backend
+
+# ===== REPORTING =====
+def _ms(seconds):
+    return '-' if seconds is None else f"{seconds * 1000:.1f}"
+
+def format_stats():
+    uptime = time.time() - registry.started_at
+    lines = [
+        f"📈 Stats (uptime {uptime / 3600:.1f} h)",
+        f"Updates: {UPDATES.total():.0f} total, {updates_per_second():.2f}/s (last {RATE_WINDOW}s)",
+        "",
+        "Handlers (calls · p50/p99 ms · errors):",
+    ]
+    for (name,) in sorted(HANDLER_SECONDS.values):
+        lines.append(
+            f"- {name}: {HANDLER_SECONDS.count(name)} · "
+            f"{_ms(HANDLER_SECONDS.quantile(0.5, name))}/{_ms(HANDLER_SECONDS.quantile(0.99, name))} · "
+            f"{HANDLER_ERRORS.values.get((name,), 0)}"
+        )
+
+    lines += ["", "Storage (ops · p50/p99 ms):"]
+    for op, store in sorted(STORAGE_SECONDS.values):
+        lines.append(
+            f"- {op} {store}: {STORAGE_SECONDS.count(op, store)} · "
+            f"{_ms(STORAGE_SECONDS.quantile(0.5, op, store))}/{_ms(STORAGE_SECONDS.quantile(0.99, op, store))}"
+        )
+
+    lines += ["", "Telegram API (calls · p50/p99 ms):"]
+    for (method,) in sorted(API_SECONDS.values):
+        lines.append(
+            f"- {method}: {API_SECONDS.count(method)} · "
+            f"{_ms(API_SECONDS.quantile(0.5, method))}/{_ms(API_SECONDS.quantile(0.99, method))}"
+        )
+    lines.append(f"API errors: {API_ERRORS.total():.0f}")
+
+    for (name, error), count in sorted(API_ERRORS.values.items()):
+        lines.append(f"- {name} {error}: {count}")
+    return '\n'.join(lines)
@@ -0,0 +1,293 @@
+# moderation.py
+
+import os
+import time
+import asyncio
+from collections import Counter
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import BadRequest
+from telegram.ext import ContextTypes, CommandHandler, CallbackQueryHandler
+
+try:
+    from settings import settings
+    from store import approved_store, pending_store, with_file_type
+    from delivery import build_albums, send_album
+    from sender import PRIORITY_BACKGROUND
+    from state import StateStore
+    from points import ledger
+except ImportError:
+    from api.settings import settings
+    from api.store import approved_store, pending_store, with_file_type
+    from api.delivery import build_albums, send_album
+    from api.sender import PRIORITY_BACKGROUND
+    from api.state import StateStore
+    from api.points import ledger
+
+PAGE_SIZE = 10
+BUTTONS_PER_ROW = 5
+COURSE_BUTTONS = 7
+DIGEST_INTERVAL = float(os.getenv('PENDING_DIGEST_INTERVAL', '900'))
+
+# Per admin: {'course': code or None, 'page': int, 'selected': [keys]}
+review_states = StateStore('pending_review', maxsize=100, ttl=24 * 60 * 60)
+_last_digest = 0.0
+_digest_task = None
+
+def get_review_state(admin_id):
+    return review_states.get(admin_id) or {'course': None, 'page': 0, 'selected': []}
+
+def queue_items(course_code=None):
+    # The same filter for the "All" view and a single course, so the course
+    # buttons count what their view shows
+    pending_store.refresh()
+    items = []
+    for key, entry in pending_store.entries.items():
+        if course_code and entry.get('course_code') != course_code:
+            continue
+        entry = with_file_type(entry)
+        if entry is not None:
+            items.append((key, entry))
+    return items
+
+def format_age(added_at):
+    if not added_at:
+        return "?"
+    minutes = int(time.time() - added_at) // 60
+    if minutes < 60:
+        return f"{minutes}m"
+    if minutes < 24 * 60:
+        return f"{minutes // 60}h"
+    return f"{minutes // (24 * 60)}d"
+
+# ===== RENDERING =====
+def render_queue(state, notice=None):
+    items = queue_items(state['course'])
+    pages = max(1, -(-len(items) // PAGE_SIZE))
+    page = min(max(state['page'], 0), pages - 1)
+    state['page'] = page
+    start = page * PAGE_SIZE
+    page_items = items[start:start + PAGE_SIZE]
+    selected = set(state['selected'])
+
+    # Plain text: file and uploader names would break Markdown
+    title = f"📥 Pending uploads{' for ' + state['course'] if state['course'] else ''}"
+    lines = [notice, ""] if notice else []
+    lines.append(f"{title}\nPage {page + 1}/{pages} · {len(items)} waiting · {len(selected)} selected\n")
+    for number, (key, entry) in enumerate(page_items, start=start + 1):
+        mark = "☑" if key in selected else "☐"
+        name = entry.get('file_name') or entry.get('file_type', 'file')
+        lines.append(
+            f"{mark} {number}. {entry.get('course_code')} · {name} · "
+            f"{entry.get('uploader_name')} · {format_age(entry.get('added_at'))}"
+        )
+    if not items:
+        lines.append("Nothing is waiting for review. 🎉")
+    text = "\n".join(lines)
+
+    toggles = [
+        InlineKeyboardButton(f"{'☑' if key in selected else '☐'} {number}", callback_data=f"pending|toggle|{key}")
+        for number, (key, _) in enumerate(page_items, start=start + 1)
+    ]
+    keyboard = [toggles[i:i + BUTTONS_PER_ROW] for i in range(0, len(toggles), BUTTONS_PER_ROW)]
+
+    selection = []
+    if page_items:
+        selection.append(InlineKeyboardButton("☑ Page", callback_data="pending|select_page|"))
+    if state['course'] and items:
+        selection.append(InlineKeyboardButton(f"☑ All {state['course']}", callback_data="pending|select_course|"))
+    if selected:
+        selection.append(InlineKeyboardButton("Clear", callback_data="pending|clear|"))
+    if selection:
+        keyboard.append(selection)
+
+    navigation = []
+    if page > 0:
+        navigation.append(InlineKeyboardButton("◀️ Prev", callback_data=f"pending|page|{page - 1}"))
+    if page_items:
+        navigation.append(InlineKeyboardButton("👁 Preview", callback_data="pending|preview|"))
+    if page < pages - 1:
+        navigation.append(InlineKeyboardButton("Next ▶️", callback_data=f"pending|page|{page + 1}"))
+    if navigation:
+        keyboard.append(navigation)
+
+    busiest = Counter(entry.get('course_code') for _, entry in queue_items()).most_common(COURSE_BUTTONS)
+    courses = [
+        InlineKeyboardButton(("• " if state['course'] is None else "") + "All", callback_data="pending|course|*")
+    ] + [
+        InlineKeyboardButton(("• " if code == state['course'] else "") + f"{code} ({count})", callback_data=f"pending|course|{code}")
+        for code, count in busiest
+    ]
+    keyboard += [courses[i:i + 4] for i in range(0, len(courses), 4)]
+
+    if selected:
+        keyboard.append([
+            InlineKeyboardButton(f"✅ Approve {len(selected)}", callback_data="pending|approve|"),
+            InlineKeyboardButton(f"❌ Reject {len(selected)}", callback_data="pending|reject|"),
+        ])
+
+    return text, InlineKeyboardMarkup(keyboard)
+
+# ===== UPLOADER NOTIFICATIONS =====
+def summarize_courses(entries):
+    counts = Counter(entry['course_code'] for entry in entries)
+    return ", ".join(f"{code} ×{count}" if count > 1 else code for code, count in sorted(counts.items()))
+
+async def notify_uploaders(bot, entries, approved):
+    # One message per uploader for the whole batch instead of one per file
+    by_uploader = {}
+    for entry in entries:
+        by_uploader.setdefault(entry['uploader_id'], []).append(entry)
+
+    async def notify(uploader_id, uploads):
+        count = len(uploads)
+        plural = "resource was" if count == 1 else f"{count} resources were"
+        if approved:
+            text = (f"✅ Your {plural} approved: {summarize_courses(uploads)}\n\n"
+                    "You can find resources by typing !CourseCode (example: !CSE421)")
+        else:
+            text = f"❌ Your {plural} rejected by admin: {summarize_courses(uploads)}"
+        await bot.send_message(chat_id=uploader_id, text=text, rate_limit_args=PRIORITY_BACKGROUND)
+
+    results = await asyncio.gather(
+        *(notify(uploader_id, uploads) for uploader_id, uploads in by_uploader.items()),
+        return_exceptions=True
+    )
+    for uploader_id, result in zip(by_uploader, results):
+        if isinstance(result, Exception):
+            print(f"Could not notify uploader {uploader_id}: {result}")
+
+async def send_pending_digest(bot):
+    # Digest mode: at most one short note per DIGEST_INTERVAL instead of the
+    # uploaded file itself for every upload. Uploads inside the interval are
+    # covered by one delayed digest at its end.
+    global _digest_task
+    wait = DIGEST_INTERVAL - (time.monotonic() - _last_digest) if _last_digest else 0
+    if wait <= 0:
+        await _send_digest(bot)
+    elif _digest_task is None or _digest_task.done():
+        _digest_task = asyncio.ensure_future(_delayed_digest(bot, wait))
+
+async def _send_digest(bot):
+    global _last_digest
+    _last_digest = time.monotonic()
+    text = f"📥 {len(pending_store)} uploads are waiting for review. Use /pending to go through them."
+    for admin_id in settings.admin_ids():
+        await bot.send_message(chat_id=admin_id, text=text, rate_limit_args=PRIORITY_BACKGROUND)
+
+async def _delayed_digest(bot, wait):
+    await asyncio.sleep(wait)
+    # Nothing to report if the queue was reviewed in the meantime
+    if not len(pending_store):
+        return
+    try:
+        await _send_digest(bot)
+    except Exception as e:
+        print(f"Could not send pending digest: {e}")
+
+# ===== HANDLERS =====
+async def pending_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = update.effective_user.id
+    if not settings.is_admin(user_id):
+        await update.message.reply_text("❌ You are not authorized to use this command.")
+        return
+
+    if context.args and context.args[0].lower() == 'digest':
+        if len(context.args) > 1 and context.args[1].lower() in ('on', 'off'):
+            await settings.update(pending_digest=context.args[1].lower() == 'on')
+        mode = "a periodic digest" if settings.get('pending_digest', False) else "every upload"
+        await update.message.reply_text(f"📬 Admins are notified with {mode}.\n\nUsage: /pending digest on|off")
+        return
+
+    state = {'course': context.args[0].upper() if context.args else None, 'page': 0, 'selected': []}
+    text, reply_markup = render_queue(state)
+    review_states[user_id] = state
+    await update.message.reply_text(text, reply_markup=reply_markup)
+
+def approve_pending(keys):
+    # Shared by the review queue and the single Approve button. Entries whose
+    # file type cannot be inferred are left pending and not returned.
+    entries = [entry for _, _, entry in pending_store.move_many_to(approved_store, keys)]
+    for entry in entries:
+        ledger.award(entry['uploader_id'], entry['uploader_name'])
+    return entries
+
+async def apply_selection(context, user_id, state, action):
+    # Clear the selection before awaiting, so a second tap finds nothing to do
+    keys = state['selected']
+    state['selected'] = []
+    review_states[user_id] = state
+    if action == 'approve':
+        entries = approve_pending(keys)
+    else:
+        entries = [entry for _, entry in pending_store.pop_many(keys)]
+    await pending_store.flush()
+    await ledger.flush()
+    if not entries:
+        return "Nothing to do, the selection was already handled."
+
+    verb = "Approved" if action == 'approve' else "Rejected"
+    notice = f"{'✅' if action == 'approve' else '❌'} {verb} {len(entries)} resource{'s' if len(entries) != 1 else ''}."
+    await notify_uploaders(context.bot, entries, approved=action == 'approve')
+    return notice
+
+async def pending_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    user_id = query.from_user.id
+    if not settings.is_admin(user_id):
+        await query.answer("You are not authorized to do this.", show_alert=True)
+        return
+
+    _, action, argument = query.data.split("|", 2)
+    state = get_review_state(user_id)
+    notice = None
+
+    if action == 'preview':
+        await query.answer()
+        start = state['page'] * PAGE_SIZE
+        page_items = queue_items(state['course'])[start:start + PAGE_SIZE]
+        for album in build_albums(page_items):
+            await send_album(
+                context.bot, user_id, album,
+                lambda number, entry: f"#{start + number} {entry['course_code']} · {entry.get('uploader_name')}"
+            )
+        return
+
+    if action in ('approve', 'reject'):
+        await query.answer("Working…")
+        notice = await apply_selection(context, user_id, state, action)
+    else:
+        await query.answer()
+        selected = dict.fromkeys(state['selected'])
+        if action == 'toggle':
+            if argument in selected:
+                del selected[argument]
+            elif argument in pending_store:
+                selected[argument] = None
+        elif action == 'select_page':
+            start = state['page'] * PAGE_SIZE
+            selected.update(dict.fromkeys(key for key, _ in queue_items(state['course'])[start:start + PAGE_SIZE]))
+        elif action == 'select_course':
+            selected.update(dict.fromkeys(key for key, _ in queue_items(state['course'])))
+        elif action == 'clear':
+            selected = {}
+        elif action == 'page':
+            state['page'] = int(argument)
+        elif action == 'course':
+            state['course'] = None if argument == '*' else argument
+            state['page'] = 0
+        # Drop selections another admin has handled in the meantime
+        state['selected'] = [key for key in selected if key in pending_store]
+
+    text, reply_markup = render_queue(state, notice)
+    review_states[user_id] = state
+    try:
+        await query.edit_message_text(text, reply_markup=reply_markup)
+    except BadRequest:
+        # Nothing changed on screen
+        pass
+
+def get_pending_handler():
+    return CommandHandler("pending", pending_command)
+
+def get_pending_callback_handler():
+    return CallbackQueryHandler(pending_callback, pattern=r'^pending\|')
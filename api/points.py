@@ -0,0 +1,154 @@
+# points.py
+
+import sys
+import asyncio
+from bisect import bisect_left, insort
+from telegram import Update
+from telegram.ext import ContextTypes, CommandHandler
+
+try:
+    from settings import settings
+    from storage import get_backend
+    from store import approved_store, CacheWrites
+    from writer import writer
+except ImportError:
+    from api.settings import settings
+    from api.storage import get_backend
+    from api.store import approved_store, CacheWrites
+    from api.writer import writer
+
+POINTS_PER_UPLOAD = 1
+LEADERBOARD_SIZE = 10
+
+# ===== POINTS LEDGER =====
+# points.json maps uploader_id (as a string) to {'points': int, 'name': str};
+# bare integers from older files are read as points without a name. The
+# ranking is a sorted list of (-points, user_id) kept in step with every
+# award, so the leaderboard is a slice and a rank is one bisect.
+class PointsLedger:
+    def __init__(self, backend=None):
+        self._backend = backend
+        self.points = {}
+        self.ranking = []
+        self._writes = CacheWrites('points')
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            self._backend = get_backend()
+        return self._backend
+
+    def refresh(self):
+        if not self._writes.stale(self.backend):
+            return
+
+        self.points = {}
+        for user_id, record in self.backend.load('points').items():
+            if not isinstance(record, dict):
+                record = {'points': record, 'name': None}
+            self.points[str(user_id)] = record
+        self.ranking = sorted((-record['points'], user_id) for user_id, record in self.points.items())
+        self._writes.loaded(self.backend)
+
+    def _submit(self, ops):
+        self._writes.submit(self.backend, ops)
+
+    async def flush(self):
+        await self._writes.flush()
+
+    def award(self, user_id, name, amount=POINTS_PER_UPLOAD):
+        self.refresh()
+        user_id = str(user_id)
+        record = self.points.get(user_id)
+        if record is None:
+            record = {'points': 0, 'name': name}
+        else:
+            del self.ranking[bisect_left(self.ranking, (-record['points'], user_id))]
+            record = {'points': record['points'], 'name': name or record['name']}
+        record['points'] += amount
+        self.points[user_id] = record
+        insort(self.ranking, (-record['points'], user_id))
+        self._submit([('put', 'points', user_id, record)])
+
+    def points_of(self, user_id):
+        self.refresh()
+        record = self.points.get(str(user_id))
+        return record['points'] if record else 0
+
+    def rank_of(self, user_id):
+        self.refresh()
+        record = self.points.get(str(user_id))
+        if record is None:
+            return None
+        return bisect_left(self.ranking, (-record['points'], str(user_id))) + 1
+
+    def top(self, limit=LEADERBOARD_SIZE):
+        self.refresh()
+        return [(user_id, self.points[user_id]) for _, user_id in self.ranking[:limit]]
+
+    async def rebuild(self, store=approved_store):
+        # Recount from the approved resources; the only full scan, run on demand
+        store.refresh()
+        points = {}
+        for entry in store.entries.values():
+            user_id = entry.get('uploader_id')
+            if user_id is None:
+                continue
+            record = points.setdefault(str(user_id), {'points': 0, 'name': None})
+            record['points'] += POINTS_PER_UPLOAD
+            record['name'] = entry.get('uploader_name') or record['name']
+        self._submit([('replace', 'points', points)])
+        await self.flush()
+        self._writes.version = None
+        self.refresh()
+        return len(points)
+
+ledger = PointsLedger()
+
+# ===== HANDLERS =====
+async def leaderboard(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    top = ledger.top()
+    if not top:
+        await update.message.reply_text("No points yet. Be the first: /upload a resource! 🚀")
+        return
+
+    medals = {1: "🥇", 2: "🥈", 3: "🥉"}
+    lines = [
+        f"{medals.get(rank, f'{rank}.')} {record['name'] or 'Anonymous'} · {record['points']} pts"
+        for rank, (_, record) in enumerate(top, start=1)
+    ]
+    user_id = update.effective_user.id
+    rank = ledger.rank_of(user_id)
+    if rank and rank > len(top):
+        lines.append(f"\nYou: #{rank} · {ledger.points_of(user_id)} pts")
+    await update.message.reply_text("🏆 Top contributors\n\n" + "\n".join(lines))
+
+async def mypoints(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = update.effective_user.id
+    rank = ledger.rank_of(user_id)
+    if rank is None:
+        await update.message.reply_text("You have no points yet. Every approved upload earns a point. Use /upload 🚀")
+        return
+    await update.message.reply_text(f"⭐ You have {ledger.points_of(user_id)} points (rank #{rank} of {len(ledger.ranking)}).")
+
+async def rebuild_points(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not settings.is_admin(update.effective_user.id):
+        await update.message.reply_text("❌ You are not authorized to use this command.")
+        return
+
+    await writer.drain()
+    contributors = await ledger.rebuild()
+    await update.message.reply_text(f"🔄 Points rebuilt from approved resources: {contributors} contributors.")
+
+def get_points_handlers():
+    return [
+        CommandHandler("leaderboard", leaderboard),
+        CommandHandler("mypoints", mypoints),
+        CommandHandler("rebuildpoints", rebuild_points),
+    ]
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2 or sys.argv[1] != 'rebuild':
+        print("Usage: python points.py rebuild")
+        sys.exit(1)
+    print(f"[Points] Rebuilt points for {asyncio.run(ledger.rebuild())} contributors.")
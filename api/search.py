@@ -0,0 +1,239 @@
+# search.py
+
+import re
+
+MAX_DISTANCE = 2
+PREFIX_LIMIT = 20
+SUGGESTION_LIMIT = 5
+SUGGESTION_CANDIDATES = 32  # distance checks per pass, bounds the cost of a miss
+
+_SEPARATORS = re.compile(r'[\s\-_./]+')
+_DEPARTMENT = re.compile(r'[A-Z]+')
+
+def normalize_code(text):
+    # "cse 421", "CSE-421" and "cse421" all become "CSE421"
+    return _SEPARATORS.sub('', text).upper()
+
+def deletions(word, max_distance=MAX_DISTANCE):
+    variants = {word}
+    frontier = {word}
+    for _ in range(max_distance):
+        frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w))}
+        variants |= frontier
+    return variants
+
+def department(code):
+    match = _DEPARTMENT.match(code)
+    return match.group() if match else ''
+
+def is_transposition(a, b):
+    if len(a) != len(b):
+        return False
+    diff = [i for i in range(len(a)) if a[i] != b[i]]
+    return len(diff) == 2 and diff[1] == diff[0] + 1 and a[diff[0]] == b[diff[1]] and a[diff[1]] == b[diff[0]]
+
+def one_edit(a, b):
+    # edit_distance(a, b) == 1 without building the table
+    if len(a) == len(b):
+        return sum(1 for x, y in zip(a, b) if x != y) == 1 or is_transposition(a, b)
+    if abs(len(a) - len(b)) != 1:
+        return False
+    short, long = (a, b) if len(a) < len(b) else (b, a)
+    i = 0
+    while i < len(short) and short[i] == long[i]:
+        i += 1
+    return short[i:] == long[i + 1:]
+
+def edit_distance(a, b, limit=MAX_DISTANCE):
+    # Optimal string alignment distance, so a swapped pair (CES/CSE) costs 1
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    # Course codes mostly differ in a few characters; the shared prefix and
+    # suffix do not change the distance and shrink the table
+    start = 0
+    while start < len(a) and start < len(b) and a[start] == b[start]:
+        start += 1
+    end = 0
+    while end < len(a) - start and end < len(b) - start and a[-1 - end] == b[-1 - end]:
+        end += 1
+    a, b = a[start:len(a) - end], b[start:len(b) - end]
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+# ===== SEARCH INDEX =====
+class _TrieNode:
+    __slots__ = ('children', 'terminal')
+
+    def __init__(self):
+        self.children = {}
+        self.terminal = False
+
+class CourseSearchIndex:
+    def __init__(self, max_distance=MAX_DISTANCE):
+        self.max_distance = max_distance
+        self.clear()
+
+    def clear(self):
+        self.root = _TrieNode()
+        self.codes = {}           # normalized code -> set of stored course codes
+        self.deletion_index = {}  # deletion variant -> set of normalized codes
+
+    def add(self, course_code):
+        code = normalize_code(course_code)
+        if code in self.codes:
+            self.codes[code].add(course_code)
+            return
+        self.codes[code] = {course_code}
+
+        node = self.root
+        for ch in code:
+            node = node.children.setdefault(ch, _TrieNode())
+        node.terminal = True
+
+        for variant in deletions(code, self.max_distance):
+            self.deletion_index.setdefault(variant, set()).add(code)
+
+    def remove(self, course_code):
+        code = normalize_code(course_code)
+        stored = self.codes.get(code)
+        if not stored:
+            return
+        stored.discard(course_code)
+        if stored:
+            return
+        del self.codes[code]
+
+        path = [self.root]
+        for ch in code:
+            path.append(path[-1].children[ch])
+        path[-1].terminal = False
+        for depth in range(len(code), 0, -1):
+            node = path[depth]
+            if node.terminal or node.children:
+                break
+            del path[depth - 1].children[code[depth - 1]]
+
+        for variant in deletions(code, self.max_distance):
+            bucket = self.deletion_index.get(variant)
+            if bucket is not None:
+                bucket.discard(code)
+                if not bucket:
+                    del self.deletion_index[variant]
+
+    def resolve(self, query):
+        return sorted(self.codes.get(normalize_code(query), ()))
+
+    def prefix(self, query, limit=PREFIX_LIMIT):
+        prefix = normalize_code(query)
+        node = self.root
+        for ch in prefix:
+            node = node.children.get(ch)
+            if node is None:
+                return []
+
+        results = []
+        stack = [(prefix, node)]
+        while stack and len(results) < limit:
+            code, node = stack.pop()
+            if node.terminal:
+                results.append(code)
+            for ch in sorted(node.children, reverse=True):
+                stack.append((code + ch, node.children[ch]))
+        return results
+
+    def _candidates(self, code, variants, distance):
+        # A variant with d deletions of the query matches codes that are
+        # themselves a deletion depth away; both must be within `distance`.
+        # Variants with fewer deletions come first, so the cap drops the
+        # least likely candidates.
+        candidates = {}
+        for variant in variants:
+            if len(code) - len(variant) > distance:
+                break
+            for candidate in sorted(self.deletion_index.get(variant, ())):
+                if len(candidate) - len(variant) <= distance and candidate != code:
+                    candidates[candidate] = None
+                    if len(candidates) >= SUGGESTION_CANDIDATES:
+                        return candidates
+        return candidates
+
+    def suggest(self, query, limit=SUGGESTION_LIMIT):
+        # Distance 1 first; the wider search only runs when nothing is that
+        # close. Among equal distances a swapped pair (CES421 -> CSE421) and
+        # then the query's own department rank first.
+        code = normalize_code(query)
+        variants = sorted(deletions(code, self.max_distance), key=lambda variant: (-len(variant), variant))
+        for distance in range(1, self.max_distance + 1):
+            scored = []
+            for candidate in self._candidates(code, variants, distance):
+                if distance == 1:
+                    found = 1 if one_edit(code, candidate) else 2
+                else:
+                    found = edit_distance(code, candidate, distance)
+                if found <= distance:
+                    rank = (found, not is_transposition(code, candidate), department(candidate) != department(code))
+                    scored.append((rank, candidate))
+            if scored:
+                scored.sort()
+                return [candidate for _, candidate in scored[:limit]]
+        return []
+
+# ===== STORE BINDING =====
+# Keeps an index in step with a ResourceStore: courses are added when their
+# first resource appears and removed with their last one.
+class StoreCourseIndex(CourseSearchIndex):
+    def __init__(self, store, max_distance=MAX_DISTANCE):
+        super().__init__(max_distance)
+        self.store = store
+        store.subscribe(self._on_change)
+
+    def _on_change(self, event, key, entry):
+        if event == 'reset':
+            self.clear()
+            for course_code in self.store.by_course:
+                if course_code:
+                    self.add(course_code)
+            return
+
+        course_code = entry.get('course_code')
+        if not course_code:
+            return
+        # add() is idempotent, so a batch that adds a new course several
+        # times before the first event fires still indexes it once
+        if event == 'add' and course_code in self.store.by_course:
+            self.add(course_code)
+        elif event == 'remove' and course_code not in self.store.by_course:
+            self.remove(course_code)
+
+    def _refresh(self):
+        self.store.refresh()
+
+    def resolve(self, query):
+        self._refresh()
+        return super().resolve(query)
+
+    def prefix(self, query, limit=PREFIX_LIMIT):
+        self._refresh()
+        return super().prefix(query, limit)
+
+    def suggest(self, query, limit=SUGGESTION_LIMIT):
+        self._refresh()
+        return super().suggest(query, limit)
+
+try:
+    from store import approved_store
+except ImportError:
+    from api.store import approved_store
+
+course_index = StoreCourseIndex(approved_store)
@@ -0,0 +1,206 @@
+# sender.py
+
+import os
+import asyncio
+import time
+from telegram.error import RetryAfter, TimedOut
+from telegram.ext import BaseRateLimiter
+
+try:
+    from metrics import registry, API_SECONDS, API_ERRORS
+except ImportError:
+    from api.metrics import registry, API_SECONDS, API_ERRORS
+
+# ===== LIMITS =====
+# Telegram allows roughly 30 messages/s overall, about 1 message/s per
+# private chat (with short bursts) and 20 messages/min per group. Dispatcher
+# workers each get a share of the global rate through SEND_GLOBAL_RATE.
+GLOBAL_RATE = float(os.getenv('SEND_GLOBAL_RATE', '30'))
+GLOBAL_BURST = max(1, int(GLOBAL_RATE))
+PRIVATE_CHAT_RATE = 1
+PRIVATE_CHAT_BURST = 20
+GROUP_CHAT_RATE = 20 / 60
+GROUP_CHAT_BURST = 20
+
+MAX_RETRIES = 5
+BACKOFF_BASE = 0.5
+IDLE_BUCKET_SECONDS = 300
+
+# ===== PRIORITIES =====
+# Passed as rate_limit_args on bot calls. Anything without one is treated as
+# a reply the user is waiting on.
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 1
+PRIORITY_BULK = 2
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now):
+        self._refill(now)
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+    def block(self, seconds):
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+# ===== SCHEDULER =====
+class SendScheduler(BaseRateLimiter):
+    def __init__(self, max_retries=MAX_RETRIES):
+        self.max_retries = max_retries
+        self.global_bucket = TokenBucket(GLOBAL_RATE, GLOBAL_BURST)
+        self.chat_buckets = {}
+        self.waiting = {PRIORITY_INTERACTIVE: 0, PRIORITY_BACKGROUND: 0, PRIORITY_BULK: 0}
+        # Waiters whose chat bucket has a token, i.e. only the global bucket holds them
+        self.ready = {PRIORITY_INTERACTIVE: 0, PRIORITY_BACKGROUND: 0, PRIORITY_BULK: 0}
+        self.stats = {
+            'sent': 0,
+            'failed': 0,
+            'retries': 0,
+            'retry_after': 0,
+            'timeouts': 0,
+            'max_queue_depth': 0,
+            'wait_seconds_total': 0.0,
+            'wait_seconds_max': 0.0,
+            'call_seconds_total': 0.0,
+            'call_seconds_max': 0.0,
+        }
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    def _chat_bucket(self, chat_id):
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self.chat_buckets) > 10000:
+                self._drop_idle_buckets()
+            is_group = isinstance(chat_id, str) or chat_id < 0
+            if is_group:
+                bucket = TokenBucket(GROUP_CHAT_RATE, GROUP_CHAT_BURST)
+            else:
+                bucket = TokenBucket(PRIVATE_CHAT_RATE, PRIVATE_CHAT_BURST)
+            self.chat_buckets[chat_id] = bucket
+        return bucket
+
+    def _drop_idle_buckets(self):
+        cutoff = time.monotonic() - IDLE_BUCKET_SECONDS
+        for chat_id in [c for c, b in self.chat_buckets.items() if b.updated < cutoff]:
+            del self.chat_buckets[chat_id]
+
+    def _higher_priority_ready(self, priority):
+        return any(count for level, count in self.ready.items() if level < priority)
+
+    def queue_depth(self):
+        return sum(self.waiting.values())
+
+    async def _acquire(self, chat_bucket, priority):
+        self.waiting[priority] = self.waiting.get(priority, 0) + 1
+        self.stats['max_queue_depth'] = max(self.stats['max_queue_depth'], self.queue_depth())
+        ready = False
+        try:
+            while True:
+                now = time.monotonic()
+                chat_delay = chat_bucket.delay(now) if chat_bucket is not None else 0.0
+                if (chat_delay == 0) != ready:
+                    ready = chat_delay == 0
+                    self.ready[priority] += 1 if ready else -1
+                delay = max(self.global_bucket.delay(now), chat_delay)
+
+                # Lower lanes step aside for a higher lane that could send now;
+                # one held back by its own chat (e.g. after RetryAfter) does not
+                # stall the other chats
+                if delay == 0 and self._higher_priority_ready(priority):
+                    delay = 1 / GLOBAL_RATE
+
+                if delay == 0:
+                    self.global_bucket.take()
+                    if chat_bucket is not None:
+                        chat_bucket.take()
+                    return
+                await asyncio.sleep(delay)
+        finally:
+            self.waiting[priority] -= 1
+            if ready:
+                self.ready[priority] -= 1
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        priority = PRIORITY_INTERACTIVE if rate_limit_args is None else rate_limit_args
+        chat_id = data.get('chat_id')
+        if isinstance(chat_id, str) and chat_id.lstrip('-').isdigit():
+            chat_id = int(chat_id)
+        chat_bucket = self._chat_bucket(chat_id) if chat_id is not None else None
+
+        for attempt in range(self.max_retries + 1):
+            queued_at = time.monotonic()
+            await self._acquire(chat_bucket, priority)
+            started_at = time.monotonic()
+            self._record('wait_seconds', started_at - queued_at)
+
+            try:
+                result = await self._call(endpoint, callback, args, kwargs)
+            except RetryAfter as e:
+                self.stats['retry_after'] += 1
+                (chat_bucket or self.global_bucket).block(e.retry_after)
+                if attempt == self.max_retries:
+                    self.stats['failed'] += 1
+                    raise
+            except TimedOut:
+                self.stats['timeouts'] += 1
+                if attempt == self.max_retries:
+                    self.stats['failed'] += 1
+                    raise
+                await asyncio.sleep(BACKOFF_BASE * 2 ** attempt)
+            except Exception:
+                self.stats['failed'] += 1
+                raise
+            else:
+                self._record('call_seconds', time.monotonic() - started_at)
+                self.stats['sent'] += 1
+                return result
+            self.stats['retries'] += 1
+
+    async def _call(self, endpoint, callback, args, kwargs):
+        started_at = time.monotonic()
+        try:
+            return await callback(*args, **kwargs)
+        except Exception as e:
+            API_ERRORS.inc(endpoint, type(e).__name__)
+            raise
+        finally:
+            API_SECONDS.observe(time.monotonic() - started_at, endpoint)
+
+    def _record(self, name, seconds):
+        self.stats[f'{name}_total'] += seconds
+        self.stats[f'{name}_max'] = max(self.stats[f'{name}_max'], seconds)
+
+    def snapshot(self):
+        snapshot = dict(self.stats)
+        snapshot['queue_depth'] = self.queue_depth()
+        for level, count in self.waiting.items():
+            snapshot[f'queue_depth_p{level}'] = count
+        calls = snapshot['sent'] + snapshot['failed'] + snapshot['retries']
+        snapshot['avg_wait_seconds'] = snapshot['wait_seconds_total'] / calls if calls else 0.0
+        snapshot['avg_call_seconds'] = snapshot['call_seconds_total'] / snapshot['sent'] if snapshot['sent'] else 0.0
+        return snapshot
+
+scheduler = SendScheduler()
+
+registry.gauge('bot_send_queue_depth', 'Outbound calls waiting for a send slot', scheduler.queue_depth)
@@ -0,0 +1,95 @@
+# settings.py
+
+import os
+import re
+import time
+
+try:
+    from storage import get_backend
+    from writer import writer
+except ImportError:
+    from api.storage import get_backend
+    from api.writer import writer
+
+# Admins from the environment are always admins, more can be added in config
+ENV_ADMIN_IDS = {
+    int(admin_id) for admin_id in re.split(r'[,\s]+', os.getenv('ADMIN_IDS', os.getenv('ADMIN_ID', '5214922760')))
+    if admin_id
+}
+CHECK_INTERVAL = float(os.getenv('CONFIG_CHECK_INTERVAL', '5'))
+
+DEFAULT_CONFIG = {
+    'admin_approval_required': True,
+    'admin_ids': [],
+    'course_policies': {},  # course code or department -> 'auto' | 'required'
+    'pending_digest': False,  # notify admins with a periodic digest instead of every upload
+}
+POLICIES = ('auto', 'required')
+
+# ===== CONFIG SERVICE =====
+# Caches config.json in memory. The backend version is checked at most every
+# CHECK_INTERVAL seconds (or on reload()), so handlers read settings without
+# touching the disk. Handlers read through get() on every use, so a change is
+# picked up without notifying them.
+class ConfigService:
+    def __init__(self, backend=None):
+        self._backend = backend
+        self._config = None
+        self._version = None
+        self._checked_at = 0.0
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            self._backend = get_backend()
+        return self._backend
+
+    def reload(self, force=False):
+        version = self.backend.version('config')
+        self._checked_at = time.monotonic()
+        if not force and self._config is not None and version is not None and version == self._version:
+            return False
+
+        stored = self.backend.load('config')
+        config = dict(DEFAULT_CONFIG)
+        config.update(stored)
+        if not stored:
+            writer.submit(self.backend, [('replace', 'config', config)])
+
+        changed = config != self._config
+        self._config = config
+        self._version = self.backend.version('config')
+        return changed
+
+    def current(self):
+        if self._config is None or time.monotonic() - self._checked_at >= CHECK_INTERVAL:
+            self.reload()
+        return self._config
+
+    def get(self, key, default=None):
+        return self.current().get(key, default)
+
+    async def update(self, **changes):
+        config = dict(self.current())
+        config.update(changes)
+        await writer.submit(self.backend, [('replace', 'config', config)])
+        self.reload(force=True)
+        return self._config
+
+    # ----- admins -----
+    def admin_ids(self):
+        return ENV_ADMIN_IDS | {int(admin_id) for admin_id in self.get('admin_ids', [])}
+
+    def is_admin(self, user_id):
+        return user_id in self.admin_ids()
+
+    # ----- approval policy -----
+    def approval_required(self, course_code):
+        policies = self.get('course_policies', {})
+        department = re.match(r'[A-Z]*', course_code).group(0)
+        policy = policies.get(course_code) or policies.get(department)
+        if policy in POLICIES:
+            return policy == 'required'
+        return self.get('admin_approval_required', True)
+
+settings = ConfigService()
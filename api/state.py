@@ -0,0 +1,210 @@
+# state.py
+
+import os
+import json
+import time
+import sqlite3
+from collections import OrderedDict
+
+try:
+    from storage import DATA_DIR, SQLITE_FILE
+    from metrics import registry
+except ImportError:
+    from api.storage import DATA_DIR, SQLITE_FILE
+    from api.metrics import registry
+
+# Set STATE_DB to keep conversation state across restarts and cold starts.
+# With the SQLite storage backend it defaults to a database next to the
+# resource one. It must be a separate file: SqliteBackend.version() is
+# PRAGMA data_version, which changes on every write to the database, so
+# state writes there would make every store reload.
+STATE_FILE = os.path.join(DATA_DIR, 'state.db')
+STATE_DB = os.getenv('STATE_DB') or (STATE_FILE if os.getenv('STORAGE_BACKEND') == 'sqlite' else None)
+if STATE_DB and os.path.abspath(STATE_DB) == os.path.abspath(SQLITE_FILE):
+    print(f"[State] STATE_DB must not be the storage database; using {STATE_FILE}")
+    STATE_DB = STATE_FILE
+DEFAULT_MAXSIZE = 10000
+DEFAULT_TTL = 30 * 60
+SWEEP_EVERY = 256
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS conversation_state (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+);
+CREATE INDEX IF NOT EXISTS idx_conversation_state_expiry ON conversation_state (expires_at);
+"""
+
+_connections = {}
+STORES = []
+
+def _connect(path):
+    conn = _connections.get(path)
+    if conn is None:
+        conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.executescript(SCHEMA)
+        _connections[path] = conn
+    return conn
+
+# ===== STATE STORE =====
+# Bounded mapping for per-user conversation state. Entries expire after
+# `ttl` seconds and the least recently used entry is evicted once `maxsize`
+# is reached. With a database path every write goes through to SQLite and
+# misses fall back to it, so flows survive restarts.
+class StateStore:
+    def __init__(self, namespace, maxsize=DEFAULT_MAXSIZE, ttl=DEFAULT_TTL, path=STATE_DB):
+        self.namespace = namespace
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.path = path
+        self._entries = OrderedDict()
+        self._ops = 0
+        self.stats = {'hits': 0, 'misses': 0, 'expired': 0, 'evicted': 0, 'db_hits': 0, 'sets': 0}
+        STORES.append(self)
+
+    @property
+    def db(self):
+        return _connect(self.path) if self.path else None
+
+    def _expire(self, key):
+        self._entries.pop(key, None)
+        self.stats['expired'] += 1
+        if self.db:
+            self.db.execute(
+                'DELETE FROM conversation_state WHERE namespace = ? AND key = ?',
+                (self.namespace, str(key))
+            )
+
+    def _load(self, key):
+        if not self.db:
+            return None
+        row = self.db.execute(
+            'SELECT value, expires_at FROM conversation_state WHERE namespace = ? AND key = ?',
+            (self.namespace, str(key))
+        ).fetchone()
+        if row is None:
+            return None
+        value, expires_at = json.loads(row[0]), row[1]
+        if expires_at <= time.time():
+            self._expire(key)
+            return None
+        self.stats['db_hits'] += 1
+        self._remember(key, value, expires_at)
+        return value
+
+    def _remember(self, key, value, expires_at):
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.stats['evicted'] += 1
+
+    def _sweep(self):
+        now = time.time()
+        for key in [k for k, (expires_at, _) in self._entries.items() if expires_at <= now]:
+            self._expire(key)
+        if self.db:
+            self.db.execute(
+                'DELETE FROM conversation_state WHERE namespace = ? AND expires_at <= ?',
+                (self.namespace, now)
+            )
+
+    def get(self, key, default=None):
+        item = self._entries.get(key)
+        if item is not None:
+            expires_at, value = item
+            if expires_at > time.time():
+                self._entries.move_to_end(key)
+                self.stats['hits'] += 1
+                return value
+            self._expire(key)
+        else:
+            value = self._load(key)
+            if value is not None:
+                self.stats['hits'] += 1
+                return value
+        self.stats['misses'] += 1
+        return default
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.time() + (ttl or self.ttl)
+        self._remember(key, value, expires_at)
+        self.stats['sets'] += 1
+        if self.db:
+            self.db.execute(
+                'INSERT OR REPLACE INTO conversation_state (namespace, key, value, expires_at) '
+                'VALUES (?, ?, ?, ?)',
+                (self.namespace, str(key), json.dumps(value), expires_at)
+            )
+        self._ops += 1
+        if self._ops % SWEEP_EVERY == 0:
+            self._sweep()
+
+    def pop(self, key, default=None):
+        value = self.get(key)
+        self._entries.pop(key, None)
+        if self.db:
+            self.db.execute(
+                'DELETE FROM conversation_state WHERE namespace = ? AND key = ?',
+                (self.namespace, str(key))
+            )
+        return default if value is None else value
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self.set(key, value)
+
+    def __delitem__(self, key):
+        self.pop(key)
+
+    def __len__(self):
+        # Expired entries linger until the next sweep; they are not counted
+        now = time.time()
+        return sum(1 for expires_at, _ in self._entries.values() if expires_at > now)
+
+    def snapshot(self):
+        snapshot = dict(self.stats)
+        snapshot['size'] = len(self)
+        lookups = snapshot['hits'] + snapshot['misses']
+        snapshot['hit_ratio'] = snapshot['hits'] / lookups if lookups else 0.0
+        return snapshot
+
+# ===== METRICS =====
+registry.gauge(
+    'bot_state_entries', 'Live (unexpired) conversation state entries',
+    lambda: {(store.namespace,): len(store) for store in STORES},
+    ('store',)
+)
+registry.gauge(
+    'bot_state_events', 'Conversation state lookups, expiries and evictions since start',
+    lambda: {(store.namespace, event): count for store in STORES for event, count in store.stats.items()},
+    ('store', 'event')
+)
+registry.gauge(
+    'bot_state_hit_ratio', 'Share of state lookups answered from memory or the database',
+    lambda: {(store.namespace,): store.snapshot()['hit_ratio'] for store in STORES},
+    ('store',)
+)
+
+def format_state_stats():
+    lines = ["Conversation state (live · hit ratio · expired · evicted):"]
+    for store in STORES:
+        snapshot = store.snapshot()
+        lines.append(
+            f"- {store.namespace}: {snapshot['size']} · {snapshot['hit_ratio']:.0%} · "
+            f"{snapshot['expired']} · {snapshot['evicted']}"
+        )
+    return '\n'.join(lines)
@@ -0,0 +1,272 @@
+# store.py
+
+import asyncio
+from uuid import uuid4
+
+try:
+    from storage import get_backend
+    from writer import writer
+except ImportError:
+    from api.storage import get_backend
+    from api.writer import writer
+
+# Telegram file_ids start with a type tag; the bot only stores these two
+FILE_TYPE_PREFIXES = {'AgAC': 'photo', 'BQAC': 'document'}
+FILE_TYPES = ('photo', 'document')
+
+def infer_file_type(file_id):
+    return FILE_TYPE_PREFIXES.get(file_id[:4])
+
+def with_file_type(entry):
+    # Older entries have no file_type; it is inferred from the file_id. None
+    # when the type is unknown, as nothing could be sent from the entry.
+    if 'file_id' not in entry:
+        return None
+    if entry.get('file_type') in FILE_TYPES:
+        return entry
+    file_type = infer_file_type(entry['file_id'])
+    return dict(entry, file_type=file_type) if file_type else None
+
+def landed_version(version, ok, versions, name):
+    # The version a cache holds once its own write has landed. It only moves
+    # forward when nothing else was written in between; otherwise None, so
+    # the next refresh reloads and picks up the other process's write. A
+    # batch with several writes of one cache reports the same pair to each.
+    if not ok or version is None:
+        return None
+    if name not in versions:
+        return version  # the batch did not touch this cache
+    before, after = versions[name]
+    if after is not None and version in (before, after):
+        return after
+    return None
+
+# ===== CACHE WRITES =====
+# Write bookkeeping shared by the in-memory caches (ResourceStore,
+# PointsLedger, Recipients). While their own writes are queued memory is
+# ahead of the backend, so stale() holds off reloads; flush() waits for the
+# queued writes; the version moves on through landed_version().
+class CacheWrites:
+    def __init__(self, name):
+        self.name = name
+        self.version = None
+        self.pending = 0
+        self.futures = set()
+
+    def stale(self, backend):
+        if self.pending:
+            return False
+        version = backend.version(self.name)
+        return version is None or version != self.version
+
+    def loaded(self, backend):
+        self.version = backend.version(self.name)
+
+    def submit(self, backend, ops, *others):
+        # `others` are caches written by the same batch, e.g. both sides of
+        # a move
+        caches = (self,) + others
+        for cache in caches:
+            cache.pending += 1
+
+        def applied(ok, versions):
+            for cache in caches:
+                cache.pending -= 1
+                cache.version = landed_version(cache.version, ok, versions, cache.name)
+
+        future = writer.submit(backend, ops, applied)
+        if future is not None:
+            for cache in caches:
+                cache.futures.add(future)
+                future.add_done_callback(cache.futures.discard)
+        return future
+
+    async def flush(self):
+        if not self.futures:
+            return
+        for result in await asyncio.gather(*self.futures, return_exceptions=True):
+            if isinstance(result, Exception):
+                raise result
+
+def content_keys(entry):
+    # Telegram's file_unique_id is stable across re-uploads of the same file;
+    # file_id and document name+size cover entries recorded before it was.
+    keys = []
+    if entry.get('file_unique_id'):
+        keys.append(f"uid:{entry['file_unique_id']}")
+    if entry.get('file_id'):
+        keys.append(f"fid:{entry['file_id']}")
+    if entry.get('file_name') and entry.get('file_size'):
+        keys.append(f"doc:{entry['file_name']}:{entry['file_size']}")
+    return keys
+
+# ===== RESOURCE STORE =====
+# Keeps a resource store parsed in memory together with a course_code index.
+# The backend is only re-read when its version changes (file mtime/size for
+# JSON, data_version for SQLite); writes made through the store update the
+# index in place. A (course_code, content key) index backs duplicate
+# detection. Listeners registered with subscribe() are called as
+# listener(event, key, entry) with 'add'/'remove' for single changes and
+# 'reset' after a full reload.
+#
+# Mutations change the in-memory state synchronously, so a check followed by
+# a write in a handler cannot interleave with another update, and hand the
+# backend operation to the store writer. Await flush() before telling a user
+# that a change was saved.
+class ResourceStore:
+    def __init__(self, name, backend=None):
+        self.name = name
+        self._backend = backend
+        self.entries = {}
+        self.by_course = {}
+        self.by_content = {}
+        self.listeners = []
+        self._writes = CacheWrites(name)
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            self._backend = get_backend()
+        return self._backend
+
+    def refresh(self):
+        if not self._writes.stale(self.backend):
+            return
+
+        self.entries = dict(self.backend.load(self.name))
+        self.by_course = {}
+        self.by_content = {}
+        for key, entry in self.entries.items():
+            self._index(key, entry)
+        self._writes.loaded(self.backend)
+        self._notify('reset', None, None)
+
+    def subscribe(self, listener):
+        self.listeners.append(listener)
+        if self._writes.version is not None:
+            listener('reset', None, None)
+
+    def _notify(self, event, key, entry):
+        for listener in self.listeners:
+            listener(event, key, entry)
+
+    def _index(self, key, entry):
+        for content_key in content_keys(entry):
+            self.by_content.setdefault((entry.get('course_code'), content_key), key)
+        if 'file_type' not in entry or 'file_id' not in entry:
+            return
+        self.by_course.setdefault(entry.get('course_code'), {})[key] = None
+
+    def _unindex(self, key, entry):
+        course_code = entry.get('course_code')
+        for content_key in content_keys(entry):
+            if self.by_content.get((course_code, content_key)) == key:
+                del self.by_content[(course_code, content_key)]
+        keys = self.by_course.get(course_code)
+        if not keys or key not in keys:
+            return
+        del keys[key]
+        if not keys:
+            del self.by_course[course_code]
+
+    def _submit(self, ops, *others):
+        self._writes.submit(self.backend, ops, *(store._writes for store in others))
+
+    async def flush(self):
+        await self._writes.flush()
+
+    # ----- reads -----
+    def get(self, key):
+        self.refresh()
+        return self.entries.get(key)
+
+    def __contains__(self, key):
+        self.refresh()
+        return key in self.entries
+
+    def find_course(self, course_code):
+        self.refresh()
+        return [(key, self.entries[key]) for key in self.by_course.get(course_code, ())]
+
+    def find_duplicate(self, course_code, entry):
+        self.refresh()
+        for content_key in content_keys(entry):
+            key = self.by_content.get((course_code, content_key))
+            if key is not None:
+                return key
+        return None
+
+    def course_codes(self):
+        self.refresh()
+        return self.by_course.keys()
+
+    def __len__(self):
+        self.refresh()
+        return len(self.entries)
+
+    # ----- writes -----
+    def add(self, entry, key=None):
+        self.refresh()
+        if key is None:
+            key = str(uuid4())[:8]
+        self.entries[key] = entry
+        self._index(key, entry)
+        self._submit([('put', self.name, key, entry)])
+        self._notify('add', key, entry)
+        return key
+
+    def pop(self, key):
+        removed = self.pop_many([key])
+        return removed[0][1] if removed else None
+
+    def pop_many(self, keys):
+        # Keys that are already gone are skipped; the rest is one backend write
+        self.refresh()
+        removed = []
+        for key in dict.fromkeys(keys):
+            entry = self.entries.pop(key, None)
+            if entry is None:
+                continue
+            self._unindex(key, entry)
+            removed.append((key, entry))
+        if removed:
+            self._submit([('delete', self.name, key) for key, _ in removed])
+        for key, entry in removed:
+            self._notify('remove', key, entry)
+        return removed
+
+    def move_many_to(self, other, keys):
+        # Approve path: pending -> approved as a single backend write. An
+        # entry missing its file_type is stored with the inferred one; one
+        # whose type is unknown stays where it is.
+        self.refresh()
+        other.refresh()
+        moved = []
+        ops = []
+        for key in dict.fromkeys(keys):
+            entry = self.entries.get(key)
+            if entry is None:
+                continue
+            fixed = with_file_type(entry)
+            if fixed is None:
+                continue
+            new_key = str(uuid4())[:8]
+            del self.entries[key]
+            self._unindex(key, entry)
+            other.entries[new_key] = fixed
+            other._index(new_key, fixed)
+            moved.append((key, new_key, fixed))
+            if fixed is entry:
+                ops.append(('move', self.name, other.name, key, new_key))
+            else:
+                ops += [('delete', self.name, key), ('put', other.name, new_key, fixed)]
+        if ops:
+            self._submit(ops, other)
+
+        for key, new_key, entry in moved:
+            self._notify('remove', key, entry)
+            other._notify('add', new_key, entry)
+        return moved
+
+approved_store = ResourceStore('approved')
+pending_store = ResourceStore('pending')
@@ -0,0 +1,88 @@
+# summary.py
+
+import re
+import time
+from bisect import bisect_left, insort
+
+try:
+    from store import approved_store
+except ImportError:
+    from api.store import approved_store
+
+_DEPARTMENT = re.compile(r'[A-Z]+')
+
+def department_of(course_code):
+    match = _DEPARTMENT.match(course_code)
+    return match.group(0) if match else course_code
+
+# ===== COURSE SUMMARY =====
+# Per-course resource count and last-updated time, kept in step with the
+# approved store through its add/remove events. Course codes are kept in
+# sorted lists (overall and per department) so pages can be sliced directly.
+class CourseSummary:
+    def __init__(self, store):
+        self.store = store
+        self.clear()
+        store.subscribe(self._on_change)
+
+    def clear(self):
+        self.courses = {}       # course_code -> {'count': int, 'updated_at': float | None}
+        self.sorted_codes = []
+        self.by_department = {}  # department -> sorted course codes
+
+    def _insert_code(self, course_code):
+        insort(self.sorted_codes, course_code)
+        insort(self.by_department.setdefault(department_of(course_code), []), course_code)
+
+    def _remove_code(self, course_code):
+        del self.sorted_codes[bisect_left(self.sorted_codes, course_code)]
+        department = department_of(course_code)
+        codes = self.by_department[department]
+        del codes[bisect_left(codes, course_code)]
+        if not codes:
+            del self.by_department[department]
+
+    def _on_change(self, event, key, entry):
+        if event == 'reset':
+            self.clear()
+            for course_code, keys in self.store.by_course.items():
+                if not course_code:
+                    continue
+                added = [self.store.entries[k].get('added_at') for k in keys]
+                added = [t for t in added if t]
+                self.courses[course_code] = {'count': len(keys), 'updated_at': max(added) if added else None}
+                self._insert_code(course_code)
+            return
+
+        course_code = entry.get('course_code')
+        if not course_code or 'file_type' not in entry or 'file_id' not in entry:
+            return
+
+        summary = self.courses.get(course_code)
+        if event == 'add':
+            if summary is None:
+                summary = self.courses[course_code] = {'count': 0, 'updated_at': None}
+                self._insert_code(course_code)
+            summary['count'] += 1
+            summary['updated_at'] = time.time()
+        elif event == 'remove' and summary is not None:
+            summary['count'] -= 1
+            summary['updated_at'] = time.time()
+            if summary['count'] <= 0:
+                del self.courses[course_code]
+                self._remove_code(course_code)
+
+    def departments(self):
+        self.store.refresh()
+        return sorted(self.by_department)
+
+    def page(self, department=None, page=0, page_size=25):
+        self.store.refresh()
+        codes = self.by_department.get(department, []) if department else self.sorted_codes
+        pages = max(1, -(-len(codes) // page_size))
+        page = min(max(page, 0), pages - 1)
+        start = page * page_size
+        rows = [(code, self.courses[code]) for code in codes[start:start + page_size]]
+        return rows, page, pages, len(codes)
+
+course_summary = CourseSummary(approved_store)
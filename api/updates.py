@@ -0,0 +1,55 @@
+# updates.py
+
+import os
+from telegram import Update
+from telegram.ext import ContextTypes, TypeHandler, ApplicationHandlerStop
+
+try:
+    from state import StateStore
+    from metrics import registry
+except ImportError:
+    from api.state import StateStore
+    from api.metrics import registry
+
+UPDATE_WINDOW = int(os.getenv('UPDATE_WINDOW', '5000'))
+
+# Recently seen update_ids and handled callback buttons. Both are bounded
+# LRU windows; with STATE_DB (or the SQLite backend) they are persisted, so
+# a redelivery that lands on a fresh instance is still recognised.
+seen_updates = StateStore('seen_updates', maxsize=UPDATE_WINDOW, ttl=24 * 60 * 60)
+handled_callbacks = StateStore('handled_callbacks', maxsize=UPDATE_WINDOW, ttl=60 * 60)
+
+DUPLICATES = registry.counter('bot_duplicate_updates_total', 'Redelivered updates and repeated button taps dropped', ('kind',))
+
+def is_duplicate(update_id):
+    if update_id in seen_updates:
+        DUPLICATES.inc('update')
+        return True
+    seen_updates[update_id] = 1
+    return False
+
+async def drop_duplicates(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # Runs before every other handler group; stops redelivered updates
+    if is_duplicate(update.update_id):
+        raise ApplicationHandlerStop
+
+def _callback_key(query):
+    if query.message:
+        return f"{query.message.chat_id}:{query.message.message_id}:{query.data}"
+    return f"{query.inline_message_id}:{query.data}"
+
+def claim_callback(query):
+    # True the first time a button on a given message is handled
+    key = _callback_key(query)
+    if key in handled_callbacks:
+        DUPLICATES.inc('callback')
+        return False
+    handled_callbacks[key] = 1
+    return True
+
+def release_callback(query):
+    # A handler that failed gives the button back, so the tap can be retried
+    handled_callbacks.pop(_callback_key(query))
+
+def get_update_dedupe_handler():
+    return TypeHandler(Update, drop_duplicates)
@@ -0,0 +1,111 @@
+# writer.py
+
+import os
+import asyncio
+
+try:
+    from metrics import registry
+except ImportError:
+    from api.metrics import registry
+
+MAX_BATCH = int(os.getenv('WRITE_BATCH_MAX', '256'))
+COALESCE_SECONDS = float(os.getenv('WRITE_COALESCE_MS', '0')) / 1000
+
+WRITE_BATCHES = registry.counter('bot_store_write_batches_total', 'Backend write batches applied')
+WRITE_OPS = registry.counter('bot_store_write_ops_total', 'Store mutations written')
+WRITE_FAILURES = registry.counter('bot_store_write_failures_total', 'Backend write batches that failed')
+
+# ===== STORE WRITER =====
+# The only place store mutations reach the backend. Stores update their
+# in-memory index immediately and submit the backend operation here; a single
+# asyncio task drains the queue and applies everything that piled up as one
+# backend batch (one rewrite per JSON file, one SQLite transaction) in a
+# worker thread, so handlers keep reading while a write is on disk. Outside a
+# running event loop (CLI scripts) operations are applied immediately.
+class StoreWriter:
+    def __init__(self):
+        self.loop = None
+        self.queue = None
+        self.task = None
+
+    def _start(self, loop):
+        self.loop = loop
+        self.queue = asyncio.Queue()
+        self.task = loop.create_task(self._run())
+
+    def submit(self, backend, ops, on_applied=None):
+        # ops is a list applied all-or-nothing, even when coalesced with others.
+        # on_applied(ok, versions) gets what backend.apply() returned for the
+        # batch it landed in: {store: (version before, version after)}.
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+
+        if loop is None:
+            try:
+                versions = backend.apply(ops)
+            except Exception:
+                if on_applied:
+                    on_applied(False, None)
+                raise
+            if on_applied:
+                on_applied(True, versions)
+            return None
+
+        if self.loop is not loop or self.task is None or self.task.done():
+            self._start(loop)
+        future = loop.create_future()
+        # Callers that never await the result should not log "exception never retrieved"
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self.queue.put_nowait((backend, ops, on_applied, future))
+        return future
+
+    async def _run(self):
+        while True:
+            batch = [await self.queue.get()]
+            # Let handlers that are already runnable queue their writes too
+            await asyncio.sleep(COALESCE_SECONDS)
+            while len(batch) < MAX_BATCH and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+
+            by_backend = {}
+            for item in batch:
+                by_backend.setdefault(id(item[0]), []).append(item)
+            for items in by_backend.values():
+                await self._apply(items[0][0], items)
+
+            for _ in batch:
+                self.queue.task_done()
+
+    async def _apply(self, backend, items):
+        try:
+            versions = await asyncio.to_thread(backend.apply, [op for _, ops, _, _ in items for op in ops])
+        except Exception as e:
+            if len(items) > 1:
+                # One bad operation must not take the rest of the batch with it
+                for item in items:
+                    await self._apply(backend, [item])
+                return
+            print(f"Store write failed: {e}")
+            WRITE_FAILURES.inc()
+            for _, _, on_applied, future in items:
+                if on_applied:
+                    on_applied(False, None)
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        WRITE_BATCHES.inc()
+        WRITE_OPS.inc(amount=sum(len(ops) for _, ops, _, _ in items))
+        for _, _, on_applied, future in items:
+            if on_applied:
+                on_applied(True, versions)
+            if not future.done():
+                future.set_result(None)
+
+    async def drain(self):
+        if self.queue is not None and self.loop is asyncio.get_running_loop():
+            await self.queue.join()
+
+writer = StoreWriter()
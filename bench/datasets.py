@@ -0,0 +1,57 @@
+# datasets.py
+
+import os
+import json
+import random
+
+DEPARTMENTS = ['CSE', 'EEE', 'ECO', 'MAT', 'PHY', 'ENG', 'BUS', 'CHE', 'BIO', 'STA', 'HUM', 'ARC']
+
+def course_codes(count):
+    codes = [f"{dept}{number}" for number in range(100, 1000) for dept in DEPARTMENTS]
+    return codes[:count]
+
+def make_entry(rng, course_code, index):
+    is_photo = rng.random() < 0.25
+    prefix = 'AgACAgUAAxkBAA' if is_photo else 'BQACAgUAAxkBAA'
+    entry = {
+        "course_code": course_code,
+        "file_id": f"{prefix}{index:012d}{rng.getrandbits(64):016x}",
+        "file_type": 'photo' if is_photo else 'document',
+        "uploader_id": rng.randint(10 ** 9, 7 * 10 ** 9),
+        "uploader_name": rng.choice(['Abesh', 'Saitama', 'Nadia', 'Rafi', 'Tasnim']),
+        "added_at": 1700000000 + index,
+        "file_unique_id": f"AgAD{index:010d}",
+        "file_size": rng.randint(10_000, 20_000_000),
+    }
+    if not is_photo:
+        entry["file_name"] = f"{course_code}_notes_{index}.pdf"
+    return entry
+
+def generate(data_dir, resources, pending=200, seed=421):
+    # Course popularity is skewed: a handful of courses hold most of the files,
+    # like the real data where CSE111/CSE220 dominate.
+    rng = random.Random(seed)
+    codes = course_codes(max(50, min(len(DEPARTMENTS) * 900, resources // 40)))
+    weights = [1 / (rank + 1) for rank in range(len(codes))]
+
+    os.makedirs(data_dir, exist_ok=True)
+    chosen = rng.choices(codes, weights=weights, k=resources)
+    approved = {f"a{i:07x}": make_entry(rng, code, i) for i, code in enumerate(chosen)}
+    pending_entries = {
+        f"p{i:07x}": make_entry(rng, rng.choice(codes), resources + i) for i in range(pending)
+    }
+
+    with open(os.path.join(data_dir, 'approved.json'), 'w') as f:
+        json.dump(approved, f, indent=2)
+    with open(os.path.join(data_dir, 'pending.json'), 'w') as f:
+        json.dump(pending_entries, f, indent=2)
+    with open(os.path.join(data_dir, 'config.json'), 'w') as f:
+        json.dump({'admin_approval_required': True}, f, indent=2)
+    with open(os.path.join(data_dir, 'points.json'), 'w') as f:
+        json.dump({}, f)
+    with open(os.path.join(data_dir, 'user_ids.json'), 'w') as f:
+        json.dump([], f)
+
+    # A mid-popularity course: busy enough to need albums, not the outlier
+    sample = codes[len(codes) // 10]
+    return {'codes': codes, 'sample': sample, 'pending_keys': list(pending_entries)}
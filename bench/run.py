@@ -0,0 +1,268 @@
+# run.py
+#
+# Offline benchmark for the hot handlers. Each dataset size runs in its own
+# process against a generated data directory and a StubBot, so no network or
+# real data is touched.
+#
+#   python bench/run.py --sizes 1000,100000,1000000 --iterations 200
+#   python bench/run.py --sizes 1000 --backend sqlite --json results.json
+
+import os
+import sys
+import json
+import time
+import shutil
+import asyncio
+import argparse
+import tempfile
+import tracemalloc
+import subprocess
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+API_DIR = os.path.join(os.path.dirname(BENCH_DIR), 'api')
+TOKEN = '123456:BENCHMARK'
+BENCH_USER_ID = 424242
+MEMORY_ITERATIONS = 10
+WRITE_BUDGET = 2_000_000  # resources rewritten per write scenario, caps JSON runs
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+def bytes_written():
+    # wchar from /proc counts every byte passed to write(), so it includes
+    # JSON rewrites and SQLite/WAL pages. Not available outside Linux.
+    try:
+        with open('/proc/self/io') as f:
+            for line in f:
+                if line.startswith('wchar:'):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+# ===== UPDATE BUILDERS =====
+def message(update_id, user_id, **fields):
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': int(time.time()),
+            'chat': {'id': user_id, 'type': 'private'},
+            'from': {'id': user_id, 'is_bot': False, 'first_name': 'Bench'},
+            **fields,
+        },
+    }
+
+def callback(update_id, user_id, data):
+    return {
+        'update_id': update_id,
+        'callback_query': {
+            'id': str(update_id),
+            'from': {'id': user_id, 'is_bot': False, 'first_name': 'Admin'},
+            'chat_instance': '1',
+            'data': data,
+            'message': {
+                'message_id': update_id,
+                'date': int(time.time()),
+                'chat': {'id': user_id, 'type': 'private'},
+                'caption': 'Pending resource',
+            },
+        },
+    }
+
+def typo(code):
+    return code[1] + code[0] + code[2:] if len(code) > 2 else code + 'X'
+
+def build_scenarios(bot_module, dataset, iterations, resources):
+    admin_id = min(bot_module.settings.admin_ids())
+    sample = dataset['sample']
+    pending_keys = list(dataset['pending_keys'])
+    write_iterations = max(3, min(iterations, WRITE_BUDGET // resources, len(pending_keys) - MEMORY_ITERATIONS - 1))
+
+    def lookup(i):
+        return message(i, BENCH_USER_ID, text=f"!{sample}")
+
+    def lookup_miss(i):
+        return message(i, BENCH_USER_ID, text=f"!{typo(sample)}")
+
+    def courselist(i):
+        return message(i, BENCH_USER_ID, text='/courselist',
+                       entities=[{'type': 'bot_command', 'offset': 0, 'length': 11}])
+
+    def upload(i):
+        bot_module.user_states[BENCH_USER_ID] = {'state': 'awaiting_file', 'course_code': sample}
+        unique = f"BENCH{i:010d}"
+        return message(i, BENCH_USER_ID, document={
+            'file_id': f"BQACAgUAAxkBAA{unique}",
+            'file_unique_id': unique,
+            'file_name': f"bench_{i}.pdf",
+            'file_size': 1000 + i,
+        })
+
+    def approve(i):
+        return callback(i, admin_id, f"approve|{pending_keys.pop()}")
+
+    return [
+        ('text_handler', lookup, iterations),
+        ('text_handler_miss', lookup_miss, iterations),
+        ('courselist', courselist, iterations),
+        ('receive_file', upload, write_iterations),
+        ('button_approve', approve, write_iterations),
+    ]
+
+# ===== WORKER =====
+async def run_worker(args):
+    sys.path.insert(0, BENCH_DIR)
+    from datasets import generate
+
+    data_dir = tempfile.mkdtemp(prefix='bracu-bench-')
+    generated_at = time.perf_counter()
+    dataset = generate(data_dir, args.size)
+    generate_seconds = time.perf_counter() - generated_at
+
+    os.environ['DATA_DIR'] = data_dir
+    os.environ['STORAGE_BACKEND'] = args.backend
+    os.environ['STORAGE_DB'] = os.path.join(data_dir, 'bot.db')
+    sys.path.insert(0, API_DIR)
+
+    if args.backend == 'sqlite':
+        from storage import JsonBackend, SqliteBackend, migrate
+        migrate(JsonBackend(), SqliteBackend())
+
+    from telegram import Update
+    from telegram.ext import Application
+    from stub_bot import StubBot
+    import bot as bot_module
+    from sender import scheduler
+
+    stub = StubBot(TOKEN, rate_limiter=scheduler if args.rate_limit else None)
+    application = Application.builder().bot(stub).updater(None).build()
+    bot_module.setup_handlers(application)
+
+    errors = []
+
+    async def record_error(update, context):
+        errors.append(repr(context.error))
+
+    application.add_error_handler(record_error)
+    await application.initialize()
+
+    # Cold load: the first lookup parses the whole store and builds indexes
+    loaded_at = time.perf_counter()
+    bot_module.approved_store.refresh()
+    bot_module.course_index.prefix(dataset['sample'])
+    cold_load_seconds = time.perf_counter() - loaded_at
+
+    results = []
+    update_id = 1
+    for name, build_update, iterations in build_scenarios(bot_module, dataset, args.iterations, args.size):
+        latencies = []
+        api_calls = 0
+        request_bytes = 0
+        written = 0
+        errors.clear()
+
+        for _ in range(iterations):
+            update = Update.de_json(build_update(update_id), stub)
+            update_id += 1
+            stub.log.reset()
+            before = bytes_written()
+            started_at = time.perf_counter()
+            await application.process_update(update)
+            latencies.append(time.perf_counter() - started_at)
+            after = bytes_written()
+            api_calls += sum(stub.log.calls.values())
+            request_bytes += stub.log.request_bytes
+            if before is not None and after is not None:
+                written += after - before
+
+        tracemalloc.start()
+        baseline = tracemalloc.get_traced_memory()[0]
+        for _ in range(MEMORY_ITERATIONS):
+            update = Update.de_json(build_update(update_id), stub)
+            update_id += 1
+            await application.process_update(update)
+        peak = tracemalloc.get_traced_memory()[1] - baseline
+        tracemalloc.stop()
+
+        results.append({
+            'scenario': name,
+            'iterations': iterations,
+            'p50_ms': percentile(latencies, 0.50) * 1000,
+            'p99_ms': percentile(latencies, 0.99) * 1000,
+            'api_calls_per_op': api_calls / iterations,
+            'request_bytes_per_op': request_bytes / iterations,
+            'bytes_written_per_op': written / iterations,
+            'peak_memory_kb': peak / 1024,
+            'errors': len(errors),
+        })
+
+    await application.shutdown()
+    from storage import get_backend
+    storage_stats = dict(getattr(get_backend(), 'stats', {}))
+    shutil.rmtree(data_dir, ignore_errors=True)
+    return {
+        'size': args.size,
+        'backend': args.backend,
+        'generate_seconds': generate_seconds,
+        'cold_load_seconds': cold_load_seconds,
+        'storage_stats': storage_stats,
+        'scenarios': results,
+    }
+
+# ===== DRIVER =====
+def print_report(reports):
+    header = f"{'size':>9} {'scenario':<18} {'n':>5} {'p50 ms':>9} {'p99 ms':>9} {'calls/op':>9} {'written/op':>12} {'peak KiB':>10} {'err':>4}"
+    print(header)
+    print('-' * len(header))
+    for report in reports:
+        print(f"{report['size']:>9} {'cold_load':<18} {1:>5} {report['cold_load_seconds'] * 1000:>9.1f}")
+        for row in report['scenarios']:
+            print(
+                f"{report['size']:>9} {row['scenario']:<18} {row['iterations']:>5} "
+                f"{row['p50_ms']:>9.2f} {row['p99_ms']:>9.2f} {row['api_calls_per_op']:>9.1f} "
+                f"{row['bytes_written_per_op']:>12.0f} {row['peak_memory_kb']:>10.0f} {row['errors']:>4}"
+            )
+        stats = report.get('storage_stats', {})
+        if stats.get('journal_bytes'):
+            amplification = (stats['journal_bytes'] + stats['snapshot_bytes']) / stats['journal_bytes']
+            print(f"{report['size']:>9} journal: {stats['journal_records']} records, {stats['fsyncs']} fsyncs, "
+                  f"{stats['compactions']} compactions, write amplification {amplification:.1f}x")
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline handler benchmark")
+    parser.add_argument('--sizes', default='1000,100000', help="comma separated resource counts, e.g. 1000,100000,1000000")
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--backend', choices=('json', 'journal', 'sqlite'), default='json')
+    parser.add_argument('--rate-limit', action='store_true', help="route stub calls through the send scheduler")
+    parser.add_argument('--json', help="also write the raw results to this file")
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--size', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(asyncio.run(run_worker(args))))
+        return
+
+    reports = []
+    for size in (int(s) for s in args.sizes.split(',')):
+        command = [
+            sys.executable, os.path.abspath(__file__), '--worker', '--size', str(size),
+            '--iterations', str(args.iterations), '--backend', args.backend,
+        ]
+        if args.rate_limit:
+            command.append('--rate-limit')
+        completed = subprocess.run(command, capture_output=True, text=True, check=True)
+        reports.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+
+    print_report(reports)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(reports, f, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+# stub_bot.py
+
+import time
+from collections import Counter
+from telegram.ext import ExtBot
+from telegram.request._requestdata import RequestData
+from telegram.request._requestparameter import RequestParameter
+
+BOT_USER = {'id': 1, 'is_bot': True, 'first_name': 'Bench', 'username': 'bench_bot'}
+
+class CallLog:
+    def __init__(self):
+        self.calls = Counter()
+        self.request_bytes = 0
+        self.message_id = 0
+
+    def reset(self):
+        self.calls.clear()
+        self.request_bytes = 0
+
+# ExtBot that answers every API call locally. Calls still go through the
+# real Bot methods (argument handling, defaults, serialization), only the
+# HTTP round trip is replaced by a canned response.
+class StubBot(ExtBot):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Bot objects are frozen after __init__, so counters live on a helper
+        with self._unfrozen():
+            self.log = CallLog()
+
+    def _message(self, data):
+        self.log.message_id += 1
+        return {
+            'message_id': self.log.message_id,
+            'date': int(time.time()),
+            'chat': {'id': data.get('chat_id', 0), 'type': 'private'},
+        }
+
+    async def _respond(self, endpoint, data):
+        self.log.calls[endpoint] += 1
+        request_data = RequestData(
+            parameters=[RequestParameter.from_input(key, value) for key, value in data.items()]
+        )
+        self.log.request_bytes += len(request_data.json_payload)
+
+        if endpoint == 'getMe':
+            return BOT_USER
+        if endpoint == 'sendMediaGroup':
+            return [self._message(data) for _ in data['media']]
+        if endpoint.startswith('send') or endpoint == 'copyMessage':
+            return self._message(data)
+        return True
+
+    async def _do_post(self, endpoint, data, *, read_timeout=None, write_timeout=None,
+                       connect_timeout=None, pool_timeout=None):
+        rate_limit_args = self._extract_rl_kwargs(data)
+        if not self.rate_limiter:
+            return await self._respond(endpoint, data)
+        return await self.rate_limiter.process_request(
+            callback=self._respond,
+            args=(endpoint, data),
+            kwargs={},
+            endpoint=endpoint,
+            data=data,
+            rate_limit_args=rate_limit_args,
+        )